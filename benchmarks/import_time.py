@@ -0,0 +1,45 @@
+"""Measures the time to import mkite_engines and obtain a LocalProducer,
+compared with importing the modules the package used to import eagerly.
+
+    python benchmarks/import_time.py [-n REPEATS]
+"""
+import sys
+import argparse
+import statistics
+import subprocess
+
+STATEMENTS = {
+    "lazy": "import mkite_engines; mkite_engines.LocalProducer",
+    "eager": (
+        "import mkite_engines.base, mkite_engines.local, mkite_engines.redis, "
+        "mkite_engines.instantiate"
+    ),
+    "kiteng": "from mkite_engines.cli.kiteng import kiteng",
+}
+
+
+def time_import(statement: str, repeats: int) -> list:
+    code = f"import time; t = time.perf_counter(); {statement}; "
+    code += "print(time.perf_counter() - t)"
+
+    times = []
+    for _ in range(repeats):
+        out = subprocess.check_output([sys.executable, "-c", code])
+        times.append(float(out))
+
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    for name, statement in STATEMENTS.items():
+        times = time_import(statement, args.repeats)
+        median = statistics.median(times) * 1000
+        print(f"{name:>8}: {median:8.2f} ms (median of {args.repeats})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,70 @@
-from .base import BaseEngine, BaseProducer, BaseConsumer, EngineRoles
-from .local import LocalEngine, LocalProducer, LocalConsumer
-from .redis import RedisEngine, RedisProducer, RedisConsumer
-from .instantiate import get_engine_class, instantiate_from_dict, instantiate_from_path
-
-PUBLISHERS = {
-    "local": LocalProducer,
-    "redis": RedisProducer,
-}
+import importlib
+from collections.abc import Mapping
 
-CONSUMERS = {
-    "local": LocalConsumer,
-    "redis": RedisConsumer,
+# Submodules are imported only when one of their attributes is accessed,
+# so that using one engine does not import the dependencies of the others.
+_ATTRIBUTES = {
+    "BaseEngine": "base",
+    "BaseProducer": "base",
+    "BaseConsumer": "base",
+    "EngineRoles": "base",
+    "LocalEngine": "local",
+    "LocalProducer": "local",
+    "LocalConsumer": "local",
+    "RedisEngine": "redis",
+    "RedisProducer": "redis",
+    "RedisConsumer": "redis",
+    "ShardedEngine": "sharded",
+    "ShardedProducer": "sharded",
+    "ShardedConsumer": "sharded",
+    "SqliteEngine": "sqlite",
+    "SqliteProducer": "sqlite",
+    "SqliteConsumer": "sqlite",
+    "get_engine_class": "instantiate",
+    "instantiate_from_dict": "instantiate",
+    "instantiate_from_path": "instantiate",
 }
 
-ENGINES = {
-    "local": LocalEngine,
-    "redis": RedisEngine,
-}
+_ENGINE_MODULES = ["local", "redis", "sharded", "sqlite"]
+
+
+class LazyRegistry(Mapping):
+    """Maps the name of each engine module to one of its classes, importing
+    the module only when its class is requested.
+    """
+
+    def __init__(self, suffix: str):
+        self.suffix = suffix
+
+    def __getitem__(self, name: str):
+        if name not in _ENGINE_MODULES:
+            raise KeyError(name)
+
+        module = importlib.import_module(f".{name}", __name__)
+        return getattr(module, name.capitalize() + self.suffix)
+
+    def __iter__(self):
+        return iter(_ENGINE_MODULES)
+
+    def __len__(self):
+        return len(_ENGINE_MODULES)
+
+
+PUBLISHERS = LazyRegistry("Producer")
+CONSUMERS = LazyRegistry("Consumer")
+ENGINES = LazyRegistry("Engine")
+
+
+def __getattr__(name: str):
+    if name not in _ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    module = importlib.import_module(f".{_ATTRIBUTES[name]}", __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_ATTRIBUTES))
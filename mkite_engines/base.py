@@ -1,22 +1,132 @@
 import os
+import time
+import threading
 from enum import Enum
-from typing import List, Dict, Union
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Union, Callable, Iterable, Optional, NamedTuple
 from abc import ABC, abstractmethod
-from mkite_core.external import load_config
 
 from mkite_core.models import JobInfo, JobResults
 from .settings import EngineSettings
 
 
+BLOCK_INTERVAL = 0.1
+DECODE_CHUNKSIZE = 32
+
+
 class EngineError(Exception):
     pass
 
 
+class QueueFullError(EngineError):
+    pass
+
+
 class EngineRoles(Enum):
     producer = "producer"
     consumer = "consumer"
 
 
+class OverflowPolicy(Enum):
+    block = "block"
+    reject = "reject"
+    drop_oldest = "drop_oldest"
+
+
+class QueueDepth(NamedTuple):
+    length: int
+    nbytes: Optional[int]
+
+
+def nbytes(item) -> int:
+    """Size of `item` (in bytes) once stored by an engine"""
+    if isinstance(item, bytes):
+        return len(item)
+
+    return len(str(item).encode())
+
+
+def decode_items(
+    items: Iterable,
+    decode: Callable,
+    workers: Optional[int] = None,
+    prefetch: Optional[int] = None,
+    executor: Optional[ProcessPoolExecutor] = None,
+    chunksize: int = DECODE_CHUNKSIZE,
+):
+    """Decodes the (key, item) pairs of `items` with `decode`, yielding
+    (key, decoded) pairs in the original order.
+
+    Arguments:
+        items (iterable): (key, item) pairs to be decoded
+        decode (callable): picklable function applied to each item
+        workers (int): number of processes decoding the items. If None
+            or 0, the items are decoded in the calling process.
+        prefetch (int): maximum number of items being decoded at once.
+            Defaults to two chunks per worker.
+        executor (ProcessPoolExecutor): pool of `workers` processes to be
+            reused. If not given, a new pool is created for this call.
+        chunksize (int): number of items sent to a worker at once
+    """
+    if not workers:
+        for key, item in items:
+            yield key, decode(item)
+        return
+
+    if prefetch is None:
+        prefetch = 2 * workers * chunksize
+
+    chunksize = max(min(chunksize, prefetch), 1)
+
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield from _decode_in_pool(items, decode, executor, prefetch, chunksize)
+        return
+
+    yield from _decode_in_pool(items, decode, executor, prefetch, chunksize)
+
+
+def _decode_chunk(decode: Callable, chunk: List) -> List:
+    return [decode(item) for item in chunk]
+
+
+def _decode_in_pool(
+    items: Iterable,
+    decode: Callable,
+    executor: ProcessPoolExecutor,
+    prefetch: int,
+    chunksize: int,
+):
+    pending = deque()
+    in_flight = 0
+
+    def _submit(keys, chunk):
+        pending.append((keys, executor.submit(_decode_chunk, decode, chunk)))
+        return len(chunk)
+
+    keys, chunk = [], []
+    for key, item in items:
+        keys.append(key)
+        chunk.append(item)
+
+        if len(chunk) >= chunksize:
+            in_flight += _submit(keys, chunk)
+            keys, chunk = [], []
+
+        while in_flight >= prefetch:
+            done_keys, future = pending.popleft()
+            in_flight -= len(done_keys)
+            yield from zip(done_keys, future.result())
+
+    if chunk:
+        _submit(keys, chunk)
+
+    while pending:
+        done_keys, future = pending.popleft()
+        yield from zip(done_keys, future.result())
+
+
 class BaseEngine(ABC):
     """Manages the flow of information to/from mkite/mkwind and their processes.
     As mkite and mkwind are not coupled directly, an intermediate engine has to
@@ -25,6 +135,11 @@ class BaseEngine(ABC):
 
     SETTINGS_CLS = EngineSettings
 
+    max_queue_length: Optional[int] = None
+    max_queue_bytes: Optional[int] = None
+    overflow: OverflowPolicy = OverflowPolicy.reject
+    block_timeout: float = 10.0
+
     def __init__(
         self,
         *args,
@@ -50,6 +165,51 @@ class BaseEngine(ABC):
         settings = cls.SETTINGS_CLS.from_file(filename)
         return cls.from_settings(settings)
 
+    def close(self):
+        """Releases the connections held by the engine"""
+
+    def set_limits(
+        self,
+        max_queue_length: Optional[int] = None,
+        max_queue_bytes: Optional[int] = None,
+        overflow: str = OverflowPolicy.reject.value,
+        block_timeout: float = 10.0,
+    ):
+        """Bounds the capacity of each queue. When pushing to a full queue,
+        producers block for up to `block_timeout` seconds, reject the item
+        or drop the oldest items of the queue, depending on `overflow`.
+        """
+        self.max_queue_length = max_queue_length
+        self.max_queue_bytes = max_queue_bytes
+        self.overflow = OverflowPolicy(overflow)
+        self.block_timeout = block_timeout
+
+    @property
+    def has_limits(self) -> bool:
+        return self.max_queue_length is not None or self.max_queue_bytes is not None
+
+    def exceeds_limits(
+        self, length: int, nbytes: int, new_length: int = 1, new_bytes: int = 0
+    ) -> bool:
+        """Returns True if adding `new_length` items with `new_bytes` to a
+        queue with `length` items and `nbytes` exceeds its capacity.
+        """
+        if self.max_queue_length is not None:
+            if length + new_length > self.max_queue_length:
+                return True
+
+        if self.max_queue_bytes is not None:
+            if nbytes + new_bytes > self.max_queue_bytes:
+                return True
+
+        return False
+
+    def queue_depth(self, queue: str) -> QueueDepth:
+        """Number of items and their size (in bytes, if available) in the
+        queue. Upstream schedulers can use it to throttle themselves.
+        """
+        return QueueDepth(len(self.list_queue(queue)), None)
+
     def format_queue_name(self, queue: str):
         if self.is_queue(queue):
             return queue
@@ -90,6 +250,13 @@ class BaseEngine(ABC):
     def delete(self, key: str):
         """Deletes an item indexed by `key` from the engine"""
 
+    def delete_many(self, keys: List[str]):
+        """Deletes several items from the engine. Engines that support it
+        delete them in batches rather than one at a time.
+        """
+        for key in keys:
+            self.delete(key)
+
 
 class BaseProducer(BaseEngine):
     @abstractmethod
@@ -99,8 +266,32 @@ class BaseProducer(BaseEngine):
     def push_info(self, queue: str, info: JobInfo):
         return self.push(queue, info.encode())
 
+    def push_info_many(self, queue: str, infos: List[JobInfo], **kwargs) -> list:
+        """Adds several JobInfo to the queue"""
+        return [self.push_info(queue, info, **kwargs) for info in infos]
+
+    def _retry_full(self, push: Callable):
+        """Calls `push` until it stops raising QueueFullError if the overflow
+        policy is to block, or until `block_timeout` elapses.
+        """
+        deadline = time.monotonic() + self.block_timeout
+        while True:
+            try:
+                return push()
+
+            except QueueFullError:
+                if self.overflow != OverflowPolicy.block:
+                    raise
+
+                if time.monotonic() >= deadline:
+                    raise
+
+            time.sleep(BLOCK_INTERVAL)
+
 
 class BaseConsumer(BaseEngine):
+    _decode_pools_lock = threading.Lock()
+
     @abstractmethod
     def get(self, queue: str) -> (str, str):
         """Get an item from the queue"""
@@ -113,6 +304,12 @@ class BaseConsumer(BaseEngine):
 
         return key, item
 
+    def requeue(self, queue: str, keys: List[str]):
+        """Returns items obtained with `get` or `get_n` to the head of the
+        queue, e.g. when they could not be processed. Engines whose reads
+        do not remove items from the queue do nothing.
+        """
+
     def get_n(self, queue: str, n: int = 1000) -> (str, str):
         """Get n items from the queue"""
         i = 0
@@ -134,3 +331,69 @@ class BaseConsumer(BaseEngine):
             return None, None
 
         return key, info_cls.decode(item)
+
+    def get_info_n(
+        self,
+        queue: str,
+        n: int = 1000,
+        info_cls=JobInfo,
+        decode_workers: Optional[int] = None,
+        prefetch: Optional[int] = None,
+    ):
+        """Get up to `n` JobInfo from the queue. Raw items are fetched
+        with `get_n` and decoded in a pool of `decode_workers` processes,
+        keeping at most `prefetch` items in flight. Items without content
+        (e.g. raw items or expired jobs) are not decoded. They and the items
+        not yielded when the iteration stops early (or decoding fails) are
+        returned to the queue with `requeue`.
+        """
+        raw = self.get_n(queue, n)
+        skipped, pending = [], deque()
+
+        def _items():
+            for key, item in raw:
+                if item is None:
+                    skipped.append(key)
+                    continue
+
+                pending.append(key)
+                yield key, item
+
+        executor = self.get_decode_pool(decode_workers)
+        decode = info_cls.decode
+        decoded = decode_items(_items(), decode, decode_workers, prefetch, executor)
+
+        try:
+            for key, info in decoded:
+                pending.popleft()
+                yield key, info
+
+        finally:
+            decoded.close()
+            raw.close()
+            if skipped or pending:
+                self.requeue(queue, skipped + list(pending))
+
+    def get_decode_pool(self, workers: Optional[int]) -> Optional[ProcessPoolExecutor]:
+        """Pool of `workers` processes decoding items. Pools are kept until
+        the consumer is closed, so that consecutive batches do not pay for
+        starting new processes.
+        """
+        if not workers:
+            return None
+
+        with self._decode_pools_lock:
+            pools = self.__dict__.setdefault("_decode_pools", {})
+            if workers not in pools:
+                pools[workers] = ProcessPoolExecutor(max_workers=workers)
+
+            return pools[workers]
+
+    def close(self):
+        with self._decode_pools_lock:
+            pools = self.__dict__.pop("_decode_pools", {})
+
+        for pool in pools.values():
+            pool.shutdown()
+
+        super().close()
@@ -1,18 +1,40 @@
 import click
-
-from mkite_engines.cli.redis import redis
+import importlib
 
 
 class MkiteEnginesGroup(click.Group):
-    pass
+    """Group whose subcommands are imported only when they are used, so
+    that short-lived invocations do not pay for the imports of all engines.
+    """
+
+    def __init__(self, *args, lazy_subcommands: dict = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx):
+        return sorted(super().list_commands(ctx) + list(self.lazy_subcommands))
+
+    def get_command(self, ctx, name):
+        if name in self.lazy_subcommands:
+            return self._load_command(name)
 
+        return super().get_command(ctx, name)
 
-@click.command(cls=MkiteEnginesGroup)
+    def _load_command(self, name):
+        module, attr = self.lazy_subcommands[name].rsplit(".", 1)
+        return getattr(importlib.import_module(module), attr)
+
+
+@click.command(
+    cls=MkiteEnginesGroup,
+    lazy_subcommands={
+        "migrate": "mkite_engines.cli.migrate.migrate",
+        "redis": "mkite_engines.cli.redis.redis",
+    },
+)
 def kiteng():
     """Command line interface for mkite_core"""
 
 
-kiteng.add_command(redis)
-
 if __name__ == "__main__":
     kiteng()
@@ -0,0 +1,101 @@
+import time
+import click
+
+from mkite_core.models import JobInfo, JobResults
+
+from mkite_engines.base import EngineRoles
+from mkite_engines.instantiate import instantiate_from_path
+from mkite_engines.migrate import migrate as migrate_engines
+
+
+@click.command("migrate")
+@click.option(
+    "--from",
+    "src",
+    type=str,
+    required=True,
+    help="path to the yaml file configuring the source engine",
+)
+@click.option(
+    "--to",
+    "dst",
+    type=str,
+    required=True,
+    help="path to the yaml file configuring the destination engine",
+)
+@click.option(
+    "-q",
+    "--queue",
+    "queues",
+    type=str,
+    multiple=True,
+    help="queue to migrate (default: all queues)",
+)
+@click.option(
+    "-b",
+    "--batch-size",
+    type=int,
+    default=100,
+    help="number of items read and written at once",
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=int,
+    default=4,
+    help="number of queues migrated in parallel",
+)
+@click.option(
+    "-d",
+    "--decode-workers",
+    type=int,
+    default=0,
+    help="number of processes decoding the items",
+)
+@click.option(
+    "-c",
+    "--checkpoint",
+    type=str,
+    default=None,
+    help="path to the file recording the progress of the migration",
+)
+@click.option(
+    "-r",
+    "--results",
+    is_flag=True,
+    default=False,
+    help="If True, items are JobResults instead of JobInfo",
+)
+def migrate(src, dst, queues, batch_size, workers, decode_workers, checkpoint, results):
+    """Moves all items from one engine to another"""
+    src = instantiate_from_path(src, EngineRoles.consumer)
+    dst = instantiate_from_path(dst, EngineRoles.producer)
+
+    start = time.perf_counter()
+
+    def progress(queue, n):
+        elapsed = time.perf_counter() - start
+        print(f"{queue}: +{n} items ({elapsed:.1f} s)")
+
+    report = migrate_engines(
+        src,
+        dst,
+        queues=list(queues) or None,
+        info_cls=JobResults if results else JobInfo,
+        batch_size=batch_size,
+        workers=workers,
+        decode_workers=decode_workers,
+        checkpoint=checkpoint,
+        callback=progress,
+    )
+
+    for queue, n in report["queues"].items():
+        print(f"{queue}: {n}")
+
+    for queue, n in report["pending"].items():
+        print(f"{queue}: {n} items left, not ready to be consumed")
+
+    print(
+        f"total: {report['total']} items in {report['elapsed']:.2f} s "
+        + f"({report['rate']:.1f} items/s)"
+    )
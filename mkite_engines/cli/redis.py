@@ -10,7 +10,7 @@ def summary(engine):
         print(f"{q}: {len(res)}")
 
 
-@click.command("redis")
+@click.group("redis", invoke_without_command=True)
 @click.option(
     "-s",
     "--settings",
@@ -25,13 +25,72 @@ def summary(engine):
     default=False,
     help="If True, opens an ipython shell",
 )
-def redis(settings, interactive):
-    from IPython import embed
-
+@click.pass_context
+def redis(ctx, settings, interactive):
     engine = RedisEngine.from_file(settings)
+    ctx.obj = engine
+
+    if ctx.invoked_subcommand is not None:
+        return
+
     summary(engine)
 
     if interactive:
+        from IPython import embed
+
         r = engine.r
 
         embed()
+
+
+@redis.command("gc")
+@click.option(
+    "-b",
+    "--batch-size",
+    type=int,
+    default=1000,
+    help="number of keys inspected per SCAN batch",
+)
+@click.option(
+    "-n",
+    "--dry-run",
+    is_flag=True,
+    default=False,
+    help="If True, only reports what would be reclaimed",
+)
+@click.pass_obj
+def gc(engine, batch_size, dry_run):
+    """Applies the status TTLs to job hashes and deletes expired ones"""
+    report = engine.gc(batch_size=batch_size, dry_run=dry_run)
+
+    for k, v in report.items():
+        print(f"{k}: {v}")
+
+
+@redis.command("export")
+@click.argument("path", type=str)
+@click.option(
+    "-b",
+    "--batch-size",
+    type=int,
+    default=1000,
+    help="number of queue items per chunk",
+)
+@click.pass_obj
+def export(engine, path, batch_size):
+    """Exports all queues and their jobs to an archive"""
+    report = engine.export(path, batch_size=batch_size)
+
+    for k, v in report.items():
+        print(f"{k}: {v}")
+
+
+@redis.command("import")
+@click.argument("path", type=str)
+@click.pass_obj
+def import_(engine, path):
+    """Restores the queues and jobs of an archive"""
+    report = engine.import_(path)
+
+    for k, v in report.items():
+        print(f"{k}: {v}")
@@ -1,9 +1,14 @@
 import os
+import copy
+import json
+import threading
+from functools import lru_cache
 from mkite_core.external import load_config
 
-from .base import EngineError, EngineRoles
+from .base import BaseEngine, EngineError, EngineRoles
 
 
+@lru_cache(maxsize=None)
 def get_engine_class(module: str, role: EngineRoles):
     """Obtains the engine class given by `module` and `role`.
     For example, obtaining the class for a LocalProducer
@@ -11,6 +16,8 @@ def get_engine_class(module: str, role: EngineRoles):
 
         module="mkite_engines.local", role="producer"
 
+    Classes are resolved only once per `module` and `role`.
+
     Arguments:
         module (str): namespace of the engine module
         role (str): whether the role of the engine is producer or consumer.
@@ -29,18 +36,90 @@ def get_engine_class(module: str, role: EngineRoles):
     return _cls
 
 
-def instantiate_from_dict(settings: dict, role: EngineRoles, **kwargs):
+class EngineCache:
+    """Thread-safe cache of engine instances, keyed on their role and
+    resolved settings. Engines obtained from the cache are shared, so
+    their connections are reused instead of opened at every instantiation.
+    """
+
+    def __init__(self):
+        self._engines = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._engines)
+
+    @staticmethod
+    def make_key(settings: dict, role: EngineRoles) -> tuple:
+        return role.value, json.dumps(settings, sort_keys=True, default=str)
+
+    def get(self, settings: dict, role: EngineRoles) -> BaseEngine:
+        """Returns the cached engine for `settings` and `role`, creating it
+        if it does not exist yet.
+        """
+        key = self.make_key(settings, role)
+
+        with self._lock:
+            if key not in self._engines:
+                self._engines[key] = _instantiate(settings, role)
+
+            return self._engines[key]
+
+    def evict(self, engine: BaseEngine, close: bool = True):
+        """Removes `engine` from the cache, closing it by default"""
+        with self._lock:
+            keys = [k for k, v in self._engines.items() if v is engine]
+            for k in keys:
+                del self._engines[k]
+
+        if close:
+            engine.close()
+
+    def clear(self, close: bool = True):
+        """Removes all engines from the cache, closing them by default"""
+        with self._lock:
+            engines = list(self._engines.values())
+            self._engines = {}
+
+        if close:
+            for engine in engines:
+                engine.close()
+
+
+ENGINE_CACHE = EngineCache()
+
+_CONFIG_CACHE = {}
+_CONFIG_LOCK = threading.Lock()
+
+
+def load_config_cached(path: os.PathLike) -> dict:
+    """Loads the configuration file at `path`, which is parsed again only
+    if its modification time changes.
+    """
+    path = os.path.abspath(path)
+    mtime = os.stat(path).st_mtime_ns
+
+    with _CONFIG_LOCK:
+        cached = _CONFIG_CACHE.get(path)
+
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, load_config(path))
+
+        with _CONFIG_LOCK:
+            _CONFIG_CACHE[path] = cached
+
+    return copy.deepcopy(cached[1])
+
+
+def _instantiate(settings: dict, role: EngineRoles):
     _module_key: str = "_module"
-    _settings = {
-        **settings,
-        **kwargs,
-    }
     if _module_key not in settings:
         raise EngineError(
             "Engine settings do not specify which engine to use."
             + f"Please specify a `{_module_key}` for the engine."
         )
 
+    _settings = {**settings}
     module = _settings.pop(_module_key)
 
     cls = get_engine_class(module, role)
@@ -48,6 +127,26 @@ def instantiate_from_dict(settings: dict, role: EngineRoles, **kwargs):
     return cls(**_settings)
 
 
-def instantiate_from_path(path: os.PathLike, role: EngineRoles, **kwargs):
-    data = load_config(path)
-    return instantiate_from_dict(data, role, **kwargs)
+def instantiate_from_dict(
+    settings: dict, role: EngineRoles, cached: bool = False, **kwargs
+):
+    """Creates an engine from the `settings`, updated with `kwargs`.
+    If `cached` is True, returns the engine shared by all callers with
+    the same settings (see `EngineCache`).
+    """
+    _settings = {
+        **settings,
+        **kwargs,
+    }
+
+    if cached:
+        return ENGINE_CACHE.get(_settings, role)
+
+    return _instantiate(_settings, role)
+
+
+def instantiate_from_path(
+    path: os.PathLike, role: EngineRoles, cached: bool = False, **kwargs
+):
+    data = load_config_cached(path)
+    return instantiate_from_dict(data, role, cached=cached, **kwargs)
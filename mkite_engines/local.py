@@ -1,17 +1,47 @@
 import os
 import time
 import shutil
-from typing import Sequence, List, Union
+import threading
+from typing import Sequence, List, Dict, Union, Optional
+from concurrent.futures import ThreadPoolExecutor
 from tempfile import TemporaryDirectory
 
 from pydantic import Field, DirectoryPath
 from mkite_core.models import JobInfo, JobResults, Status
 from mkite_engines.settings import EngineSettings
 
-from .base import BaseEngine, BaseProducer, BaseConsumer
+from .base import (
+    BaseEngine,
+    BaseProducer,
+    BaseConsumer,
+    OverflowPolicy,
+    QueueDepth,
+    QueueFullError,
+    decode_items,
+)
 
 
 LOCAL_QUEUE_PREFIX = "queue-"
+DEPTH_CACHE_TTL = 1.0
+
+
+def path_size(path: os.PathLike) -> int:
+    """Total size (in bytes) of the file or folder at `path`. Raises a
+    FileNotFoundError if `path` does not exist.
+    """
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except FileNotFoundError:
+                # removed while the folder is walked
+                continue
+
+    return total
 
 
 class LocalEngineSettings(EngineSettings):
@@ -41,6 +71,10 @@ class LocalEngine(BaseEngine):
         return_abspath: bool = True,
         queue_prefix: str = LOCAL_QUEUE_PREFIX,
         delay: float = 2.0,
+        max_queue_length: Optional[int] = None,
+        max_queue_bytes: Optional[int] = None,
+        overflow: str = OverflowPolicy.reject.value,
+        block_timeout: float = 10.0,
     ):
         self.root_path = os.path.abspath(root_path)
         self.mkdir(self.root_path)
@@ -48,6 +82,9 @@ class LocalEngine(BaseEngine):
         self.return_abspath = return_abspath
         self.qprefix = queue_prefix
         self.delay = delay
+        self.set_limits(max_queue_length, max_queue_bytes, overflow, block_timeout)
+        self._depths = {}
+        self._depths_lock = threading.Lock()
 
     def __len__(self):
         return len(self.queues)
@@ -157,10 +194,92 @@ class LocalEngine(BaseEngine):
     def queues(self) -> List[str]:
         return self.list_queue_names()
 
+    def queue_depth(self, queue: str) -> QueueDepth:
+        """Number and size of the items in the queue. The counters are
+        cached for DEPTH_CACHE_TTL seconds, after which the folder is listed
+        again to account for items removed by other processes.
+        """
+        path = self.get_queue_path(queue)
+        with self._depths_lock:
+            return self._get_depth(path)
+
+    def _get_depth(self, path: os.PathLike) -> QueueDepth:
+        cached = self._depths.get(path)
+        if cached is not None and time.monotonic() - cached[1] < DEPTH_CACHE_TTL:
+            return cached[0]
+
+        length, used = 0, 0
+        for entry in self.list_path(path):
+            try:
+                used += path_size(os.path.join(path, entry))
+                length += 1
+            except FileNotFoundError:
+                # consumed by another process while the folder is listed
+                continue
+
+        depth = QueueDepth(length, used)
+        self._depths[path] = (depth, time.monotonic())
+
+        return depth
+
+    def _set_depth(self, path: os.PathLike, depth: QueueDepth):
+        _, timestamp = self._depths[path]
+        self._depths[path] = (depth, timestamp)
+
     def set_status(self, key: str, status: str = Status.DOING.value):
         src = self.abspath(key)
         return self.move_path(status, src)
 
+    def set_status_many(
+        self,
+        keys: List[str],
+        status: str = Status.DOING.value,
+        expected: Optional[str] = None,
+        max_workers: int = 8,
+    ) -> Dict[str, bool]:
+        """Moves several items to the queue `status` using a pool of threads.
+        As in `set_status`, keys are paths relative to the root of the engine
+        (e.g. `queue-ready/job.json`) or absolute paths within it.
+
+        Arguments:
+            keys (list): keys of the items to be moved
+            status (str): queue where the items will be placed
+            expected (str): if given, only moves the items whose key is in
+                the queue `expected` (compare-and-set). As renames are
+                atomic, an item is never moved twice.
+            max_workers (int): number of threads performing the renames
+
+        Returns:
+            outcomes (dict): whether each key was moved
+        """
+        if isinstance(status, Status):
+            status = status.value
+
+        if isinstance(expected, Status):
+            expected = expected.value
+
+        self.add_queue(status)
+
+        if expected is not None:
+            expected = self.abspath(self.format_queue_name(expected))
+
+        def _move(key: str) -> bool:
+            src = os.path.normpath(self.abspath(key))
+            if expected is not None and os.path.dirname(src) != expected:
+                return False
+
+            try:
+                self.move_path(status, src)
+            except (FileNotFoundError, shutil.Error):
+                return False
+
+            return True
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(_move, keys)
+
+        return dict(zip(keys, results))
+
 
 class LocalProducer(LocalEngine, BaseProducer):
     """Producer that submits a folder to a new directory"""
@@ -177,12 +296,93 @@ class LocalProducer(LocalEngine, BaseProducer):
         if not self.is_path(item):
             raise ValueError(f"Cannot submit {item}: invalid type")
 
+        if not self.has_limits:
+            return self._push_path(queue, item)
+
+        return self._retry_full(lambda: self._push_bounded(queue, item))
+
+    def _push_path(self, queue: str, item: os.PathLike):
         if self.move:
-            dst = self.move_path(queue, item)
-        else:
-            dst = self.copy_path(queue, item)
+            return self.move_path(queue, item)
 
-        return dst
+        return self.copy_path(queue, item)
+
+    def _push_bounded(self, queue: str, item: os.PathLike):
+        path = self.get_queue_path(queue)
+        size = path_size(item)
+
+        # room is reserved in the counter, so that the lock is not held
+        # while the item is copied
+        with self._depths_lock:
+            length, used = self._get_depth(path)
+            dropped = self._check_capacity(path, length, used, size)
+
+            length = length - len(dropped) + 1
+            used = used - sum(s for _, s in dropped) + size
+            self._set_depth(path, QueueDepth(length, used))
+
+        try:
+            for entry, _ in dropped:
+                self._drop(entry)
+
+            return self._push_path(queue, item)
+
+        except BaseException:
+            # the folder is listed again by the next push
+            with self._depths_lock:
+                self._depths.pop(path, None)
+
+            raise
+
+    def _drop(self, entry: os.PathLike):
+        try:
+            self.delete(entry)
+        except FileNotFoundError:
+            # already consumed or dropped by another producer
+            pass
+
+    def _check_capacity(
+        self, path: os.PathLike, length: int, used: int, size: int
+    ) -> list:
+        """Returns the (path, size) of the oldest items that have to be
+        dropped to fit a new item of `size` in the queue. Raises a
+        QueueFullError if the queue is full and items cannot be dropped.
+        """
+        if not self.exceeds_limits(length, used, 1, size):
+            return []
+
+        if self.overflow != OverflowPolicy.drop_oldest:
+            raise QueueFullError(f"Queue {path} is full")
+
+        entries = []
+        for entry in os.scandir(path):
+            if entry.name.startswith("."):
+                continue
+
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                continue
+
+        dropped = []
+        for _, entry in sorted(entries):
+            if not self.exceeds_limits(length - len(dropped), used, 1, size):
+                break
+
+            try:
+                entry_size = path_size(entry)
+            except FileNotFoundError:
+                # consumed since the folder was listed. The slot is freed,
+                # but its size is unknown until the folder is listed again
+                entry_size = 0
+
+            used = used - entry_size
+            dropped.append((entry, entry_size))
+
+        if self.exceeds_limits(length - len(dropped), used, 1, size):
+            raise QueueFullError(f"Queue {path} is full")
+
+        return dropped
 
     def push_info(
         self,
@@ -273,3 +473,22 @@ class LocalConsumer(LocalEngine, BaseConsumer):
         info = info_cls.from_json(path)
 
         return path, info
+
+    def get_info_n(
+        self,
+        queue: str,
+        n: int = 1000,
+        info_cls=JobInfo,
+        decode_workers: Optional[int] = None,
+        prefetch: Optional[int] = None,
+    ):
+        """Get up to `n` JobInfo from the queue, parsing the files in a pool
+        of `decode_workers` processes.
+        """
+        path = self.get_queue_path(queue)
+        paths = (os.path.join(path, key) for key, _ in self.get_n(queue, n))
+        items = ((p, p) for p in paths)
+
+        executor = self.get_decode_pool(decode_workers)
+        decode = info_cls.from_json
+        yield from decode_items(items, decode, decode_workers, prefetch, executor)
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import threading
+
+from typing import List, Optional, Callable
+from concurrent.futures import ThreadPoolExecutor
+from mkite_core.models import JobInfo
+
+from .base import BaseProducer, BaseConsumer
+
+
+class Checkpoint:
+    """Records the progress of a migration in a JSON file, so that an
+    interrupted migration can be resumed without revisiting the queues
+    already drained.
+    """
+
+    def __init__(self, path: Optional[os.PathLike] = None):
+        self.path = path
+        self.transferred = {}
+        self.completed = []
+        self._lock = threading.Lock()
+
+        if path is not None and os.path.exists(path):
+            with open(path, "r") as f:
+                data = json.load(f)
+
+            self.transferred = data.get("transferred", {})
+            self.completed = data.get("completed", [])
+
+    def is_completed(self, queue: str) -> bool:
+        return queue in self.completed
+
+    def update(self, queue: str, n: int):
+        with self._lock:
+            self.transferred[queue] = self.transferred.get(queue, 0) + n
+            self._save()
+
+    def complete(self, queue: str):
+        with self._lock:
+            if queue not in self.completed:
+                self.completed.append(queue)
+
+            self._save()
+
+    def _save(self):
+        if self.path is None:
+            return
+
+        data = {"transferred": self.transferred, "completed": self.completed}
+
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+
+        os.replace(tmp, self.path)
+
+
+def migrate(
+    src: BaseConsumer,
+    dst: BaseProducer,
+    queues: Optional[List[str]] = None,
+    info_cls=JobInfo,
+    status: Optional[str] = None,
+    batch_size: int = 100,
+    workers: int = 4,
+    decode_workers: Optional[int] = None,
+    checkpoint: Optional[os.PathLike] = None,
+    callback: Optional[Callable] = None,
+) -> dict:
+    """Drains the queues of `src` into `dst`. Items are read in batches
+    with `get_info_n`, written with `push_info_many` and then deleted from
+    the source. If a batch cannot be written, it is returned to the source
+    queue with `requeue`. Queues are transferred in parallel by `workers`
+    threads, so at most `workers * batch_size` items are held in memory.
+
+    Arguments:
+        src (BaseConsumer): engine from where the items are read
+        dst (BaseProducer): engine where the items are written
+        queues (list): names of the queues to migrate. Defaults to all
+            queues of `src`.
+        info_cls: class of the items (JobInfo or JobResults)
+        status (str): status of the items in `dst`, if supported
+        batch_size (int): number of items read and written at once
+        workers (int): number of queues transferred in parallel
+        decode_workers (int): number of processes decoding the items. The
+            pool of `src` is reused across batches.
+        checkpoint (str): path to a file recording the progress. Queues
+            completed in a previous run are skipped.
+        callback (callable): called as `callback(queue, n)` after each
+            batch of `n` items is transferred
+
+    Returns:
+        report (dict): items transferred per queue, total, elapsed time
+            (in seconds), throughput (in items per second) and the number
+            of items left in the queues that could not be drained (e.g.
+            items not ready to be consumed yet).
+    """
+    state = Checkpoint(checkpoint)
+
+    if queues is None:
+        queues = src.list_queue_names()
+
+    queues = [q for q in queues if not state.is_completed(q)]
+
+    push_kwargs = {} if status is None else {"status": status}
+    transferred = {q: 0 for q in queues}
+    pending = {}
+
+    def _migrate_queue(queue: str):
+        while True:
+            batch = list(
+                src.get_info_n(
+                    queue, batch_size, info_cls=info_cls, decode_workers=decode_workers
+                )
+            )
+            if not batch:
+                break
+
+            try:
+                dst.push_info_many(queue, [info for _, info in batch], **push_kwargs)
+            except BaseException:
+                src.requeue(queue, [key for key, _ in batch])
+                raise
+
+            src.delete_many([key for key, _ in batch])
+
+            transferred[queue] += len(batch)
+            state.update(queue, len(batch))
+
+            if callback is not None:
+                callback(queue, len(batch))
+
+        # items may remain if the source did not yield them yet
+        remaining = len(src.list_queue(queue))
+        if remaining > 0:
+            pending[queue] = remaining
+            return
+
+        state.complete(queue)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        list(executor.map(_migrate_queue, queues))
+
+    elapsed = time.perf_counter() - start
+    total = sum(transferred.values())
+
+    return {
+        "queues": transferred,
+        "total": total,
+        "elapsed": elapsed,
+        "rate": total / elapsed if elapsed > 0 else 0.0,
+        "pending": pending,
+    }
@@ -1,12 +1,30 @@
+import os
+import gzip
 import json
+import time
 import redis
+import threading
 
-from typing import List, Union, Optional
+from typing import List, Dict, Tuple, Union, Optional, Callable
 from pydantic import ConfigDict, Field, DirectoryPath, BaseModel
 from mkite_engines.settings import EngineSettings
 from mkite_core.models import JobInfo, JobResults, Status
 
-from .base import BaseEngine, BaseProducer, BaseConsumer
+from .base import (
+    EngineError,
+    BaseEngine,
+    BaseProducer,
+    BaseConsumer,
+    OverflowPolicy,
+    QueueDepth,
+    QueueFullError,
+    nbytes,
+)
+
+
+STATUS_REGISTRY = "statuses"
+ARCHIVE_FORMAT = "mkite-redis"
+ARCHIVE_VERSION = 1
 
 
 class RedisEngineSettings(EngineSettings):
@@ -31,6 +49,18 @@ class RedisEngineSettings(EngineSettings):
         "required",
         description="requirements of ssl certificates",
     )
+    status_ttl: Dict[str, int] = Field(
+        {},
+        description="time (in seconds) until job hashes expire, indexed by status",
+    )
+    consumed_ttl: Optional[int] = Field(
+        None,
+        description="time (in seconds) until job hashes expire after consumed",
+    )
+    hash_tags: bool = Field(
+        False,
+        description="whether job keys carry the hash tag of their queue",
+    )
     model_config = ConfigDict(env_prefix="REDIS_", case_sensitive=False)
 
 
@@ -51,6 +81,14 @@ class RedisEngine(BaseEngine):
         port: int,
         password: str = "abc",
         queue_prefix: str = "queue:",
+        status_prefix: str = "status:",
+        status_ttl: Optional[Dict[str, int]] = None,
+        consumed_ttl: Optional[int] = None,
+        hash_tags: bool = False,
+        max_queue_length: Optional[int] = None,
+        max_queue_bytes: Optional[int] = None,
+        overflow: str = OverflowPolicy.reject.value,
+        block_timeout: float = 10.0,
         **kwargs,
     ):
         self.redis_kwargs = {
@@ -61,25 +99,50 @@ class RedisEngine(BaseEngine):
             **kwargs,
         }
         self.qprefix = queue_prefix
+        self.status_prefix = status_prefix
+        self.status_ttl = dict(status_ttl or {})
+        self.consumed_ttl = consumed_ttl
+        self.hash_tags = hash_tags
+        self.set_limits(max_queue_length, max_queue_bytes, overflow, block_timeout)
         self._r = None
+        self._r_lock = threading.Lock()
 
     @property
     def r(self):
-        if self._r is None:
-            self._r = self._get_new_redis()
+        """Client of the server. Engines may be shared across threads (see
+        `EngineCache`), so the client is replaced under a lock, and only
+        once if several threads find the connection broken.
+        """
+        with self._r_lock:
+            if self._r is None:
+                self._r = self._get_new_redis()
+
+            r = self._r
 
         try:
-            self._r.ping()
+            r.ping()
 
         except redis.ConnectionError:
-            del self._r
-            self._r = self._get_new_redis()
+            with self._r_lock:
+                if self._r is None or self._r is r:
+                    self._r = self._get_new_redis()
+
+                r = self._r
 
-        return self._r
+        return r
 
     def _get_new_redis(self):
         return redis.Redis(**self.redis_kwargs)
 
+    def close(self):
+        with self._r_lock:
+            r, self._r = self._r, None
+
+        if r is not None:
+            r.close()
+
+        super().close()
+
     def list_queue(self, queue: str) -> List[str]:
         queue = self.format_queue_name(queue)
         items = self.r.lrange(queue, 0, -1)
@@ -91,25 +154,744 @@ class RedisEngine(BaseEngine):
         queues = [self.remove_queue_prefix(k) for k in queues]
         return queues
 
+    def bytes_key(self, queue: str) -> str:
+        """Key of the counter with the size of the items in `queue`"""
+        return "{" + self.format_queue_name(queue) + "}:bytes"
+
+    def queue_depth(self, queue: str) -> QueueDepth:
+        queue = self.format_queue_name(queue)
+
+        pipe = self.r.pipeline(transaction=False)
+        pipe.llen(queue)
+        pipe.get(self.bytes_key(queue))
+        length, used = pipe.execute()
+
+        return QueueDepth(length, max(int(used or 0), 0))
+
+    def _items_size(self, items: List[Union[str, bytes]]) -> int:
+        """Size of queue `items` as counted by `queue_depth`: the message of
+        their job hash, or the item itself if there is no such hash.
+        """
+        pipe = self.r.pipeline(transaction=False)
+        for item in items:
+            pipe.hstrlen(item, "msg")
+
+        sizes = pipe.execute(raise_on_error=False)
+        return sum(
+            s if isinstance(s, int) and s > 0 else nbytes(item)
+            for item, s in zip(items, sizes)
+        )
+
+    def job_key(self, queue: str, uuid: str) -> str:
+        """Key of the hash of job `uuid` pushed to `queue`. With `hash_tags`,
+        the key is prefixed by the hash tag of the queue, so that Redis
+        Cluster (or a sharded engine) places both in the same node.
+        """
+        if not self.hash_tags:
+            return uuid
+
+        return "{" + self.format_queue_name(queue) + "}" + uuid
+
     def add_queue(self, name: str):
         """Empty queues do not have to be created in Redis.
         This method exists for compatibility with other engines.
         """
         pass
 
+    def get_status_ttl(self, status: str) -> Optional[int]:
+        if isinstance(status, Status):
+            status = status.value
+
+        return self.status_ttl.get(status)
+
+    def _expire_status(
+        self, pipe, key: str, status: str, old: Optional[str] = None, consumed=False
+    ):
+        """Queues the expiration of `key` according to its `status`. For
+        statuses without a TTL, the hash is made persistent again, unless
+        it was `consumed` from a queue with status `old` and may therefore
+        carry the expiration set by `consumed_ttl`.
+        """
+        ttl = self.get_status_ttl(status)
+        if ttl is not None:
+            pipe.expire(key, ttl)
+            return
+
+        if consumed and self.consumed_ttl is not None:
+            if old is not None and self.get_status_ttl(old) is None:
+                return
+
+        pipe.persist(key)
+
+    def status_index(self, status: str) -> str:
+        """Name of the sorted set indexing the jobs with `status`"""
+        if isinstance(status, Status):
+            status = status.value
+
+        return self.status_prefix + status
+
+    def _index_status(self, pipe, key: str, status: str, old: Optional[str]):
+        """Queues the update of the status index of `key`, scored by the
+        time of the update.
+        """
+        if old is not None and old != status:
+            pipe.zrem(self.status_index(old), key)
+
+        pipe.zadd(self.status_index(status), {key: time.time()})
+        pipe.sadd(STATUS_REGISTRY, status)
+
+    def _watch_statuses(
+        self,
+        keys: List[str],
+        fn: Callable,
+        watch: List[str] = (),
+        check: Optional[Callable] = None,
+    ):
+        """Runs `fn(pipe, statuses)` in a transaction watching `keys`, where
+        `statuses` are the current statuses of the keys. The transaction
+        is retried if any of the keys (or the ones in `watch`) is modified
+        concurrently. If given, `check()` runs after the keys are watched
+        and before the transaction starts.
+
+        Returns:
+            value: return value of `fn`
+            results (list): results of the commands queued by `fn`
+        """
+        with self.r.pipeline() as pipe:
+            while True:
+                try:
+                    if keys or watch:
+                        pipe.watch(*keys, *watch)
+
+                    current = self._get_statuses(keys)
+                    if check is not None:
+                        check()
+
+                    pipe.multi()
+                    value = fn(pipe, current)
+                    return value, pipe.execute()
+
+                except redis.WatchError:
+                    continue
+
+    def _get_statuses(self, keys: List[str]) -> List[Optional[str]]:
+        pipe = self.r.pipeline(transaction=False)
+        for key in keys:
+            pipe.hget(key, "status")
+
+        return [s.decode() if s is not None else None for s in pipe.execute()]
+
     def set_status(self, key: str, status: str = Status.DOING.value):
-        self.r.hset(key, "status", status)
+        self.set_status_many([key], status)
+
+    def set_status_many(
+        self,
+        keys: List[str],
+        status: str = Status.DOING.value,
+        expected: Optional[str] = None,
+        batch_size: int = 1000,
+    ) -> Dict[str, bool]:
+        """Sets the status of several job hashes at once. Each batch of
+        keys is written in a single transaction, which also updates the
+        status index.
+
+        Arguments:
+            keys (list): keys of the job hashes to be updated
+            status (str): new status of the jobs
+            expected (str): if given, only updates the jobs whose current
+                status is `expected` (compare-and-set).
+            batch_size (int): number of keys written per transaction
+
+        Returns:
+            outcomes (dict): whether the status of each key was updated.
+                Keys without a job hash are never updated.
+        """
+        if isinstance(status, Status):
+            status = status.value
+
+        if isinstance(expected, Status):
+            expected = expected.value
+
+        outcomes = {}
+        for i in range(0, len(keys), batch_size):
+            batch = keys[i : i + batch_size]
+
+            def _set_status(pipe, current):
+                updated = {}
+                for key, old in zip(batch, current):
+                    updated[key] = old is not None
+                    if expected is not None:
+                        updated[key] = old == expected
+
+                    if not updated[key]:
+                        continue
+
+                    pipe.hset(key, "status", status)
+                    self._index_status(pipe, key, status, old)
+                    self._expire_status(pipe, key, status, old, consumed=True)
+
+                return updated
+
+            updated, _ = self._watch_statuses(batch, _set_status)
+            outcomes.update(updated)
+
+        return outcomes
 
     def delete(self, key: str):
-        self.r.delete(key)
+        if self.is_queue(key):
+            self.r.delete(key, self.bytes_key(key))
+            return
+
+        def _delete(pipe, current):
+            if current[0] is not None:
+                pipe.zrem(self.status_index(current[0]), key)
+
+            pipe.delete(key)
+
+        self._watch_statuses([key], _delete)
+
+    def delete_many(self, keys: List[str], batch_size: int = 1000):
+        """Deletes several job hashes, and their entries in the status
+        index, with one transaction per batch of keys.
+        """
+        for i in range(0, len(keys), batch_size):
+            batch = keys[i : i + batch_size]
+
+            def _delete(pipe, current):
+                for key, status in zip(batch, current):
+                    if status is not None:
+                        pipe.zrem(self.status_index(status), key)
+
+                pipe.delete(*batch)
+
+            self._watch_statuses(batch, _delete)
+
+    def list_by_status(
+        self, status: str, cursor: Union[int, str] = 0, count: int = 100
+    ) -> Tuple[Union[int, str], List[str]]:
+        """Lists the keys of the jobs with the given status, ordered by the
+        time of their last status update. The iteration starts with a cursor
+        equal to 0 and ends when the returned cursor is 0 again. Cursors
+        point to the (score, key) of the last listed job, so pages are not
+        affected by jobs leaving the index between calls.
+
+        Arguments:
+            status (str): status of the jobs
+            cursor (int or str): cursor returned by the previous call
+            count (int): maximum number of keys returned
+
+        Returns:
+            cursor (str): cursor of the next page, or 0 if there are no more
+            keys (list): keys of the jobs with `status`
+        """
+        index = self.status_index(status)
+
+        if cursor == 0:
+            entries = self.r.zrangebyscore(
+                index, "-inf", "+inf", start=0, num=count, withscores=True
+            )
+        else:
+            entries = self._entries_after(index, cursor, count)
+
+        next_cursor = 0
+        if len(entries) == count:
+            key, score = entries[-1]
+            next_cursor = f"{score!r}:{key.decode()}"
+
+        # expired hashes remain in the index until they are pruned by the gc
+        pipe = self.r.pipeline(transaction=False)
+        for key, _ in entries:
+            pipe.exists(key)
+
+        exists = pipe.execute()
+        keys = [k.decode() for (k, _), e in zip(entries, exists) if e]
+
+        return next_cursor, keys
+
+    def _entries_after(self, index: str, cursor: str, count: int) -> list:
+        """Returns up to `count` (key, score) entries of `index` after the
+        entry encoded by `cursor`. Entries with the same score are sorted
+        by key, as done by Redis.
+        """
+        score, last = cursor.split(":", 1)
+        last = last.encode()
+
+        ties = self.r.zrangebyscore(index, score, score, withscores=True)
+        entries = [(k, s) for k, s in ties if k > last][:count]
+
+        if len(entries) < count:
+            entries += self.r.zrangebyscore(
+                index,
+                f"({score}",
+                "+inf",
+                start=0,
+                num=count - len(entries),
+                withscores=True,
+            )
+
+        return entries
+
+    def count_by_status(self, prune: bool = False) -> Dict[str, int]:
+        """Counts the jobs under each status using the status index. Hashes
+        expired through their TTL are counted until the gc prunes them from
+        the index, unless `prune` is True.
+        """
+        statuses = sorted(s.decode() for s in self.r.smembers(STATUS_REGISTRY))
+
+        if prune:
+            report = {"pruned": 0}
+            for status in statuses:
+                self._prune_index(status, 1000, report, dry_run=False)
+
+        pipe = self.r.pipeline(transaction=False)
+        for status in statuses:
+            pipe.zcard(self.status_index(status))
+
+        return dict(zip(statuses, pipe.execute()))
+
+    def export(self, path: os.PathLike, batch_size: int = 1000) -> dict:
+        """Streams all queues and job hashes to a gzipped archive of JSON
+        lines. Hashes are first exported by walking the status indexes in
+        pages of `batch_size`. Queues are then found with SCAN and read in
+        chunks, along with the hashes of their items that are not indexed or
+        were updated since the export started. Jobs updated during the
+        export may thus be written twice, in which case the last record
+        wins. Only the names of the queues are kept in memory.
+
+        Arguments:
+            path (str): path of the archive
+            batch_size (int): number of jobs or queue items per chunk
+
+        Returns:
+            report (dict): number of exported queues, items and jobs
+        """
+        report = {"queues": 0, "items": 0, "jobs": 0}
+        started = time.time()
+
+        with gzip.open(path, "wt") as f:
+            header = {"format": ARCHIVE_FORMAT, "version": ARCHIVE_VERSION}
+            self._write_record(f, header)
+
+            for status in self.r.smembers(STATUS_REGISTRY):
+                cursor = 0
+                while True:
+                    cursor, keys = self.list_by_status(
+                        status.decode(), cursor, batch_size
+                    )
+                    report["jobs"] += self._export_jobs_batch(f, keys)
+                    if cursor == 0:
+                        break
+
+            # SCAN may return a key more than once
+            queues = self.r.scan_iter(
+                match=self.qprefix + "*", count=batch_size, _type="list"
+            )
+            queues = sorted({queue.decode() for queue in queues})
+            report["queues"] = len(queues)
+
+            for queue in queues:
+                start = 0
+                while True:
+                    items = self.r.lrange(queue, start, start + batch_size - 1)
+                    if not items:
+                        break
+
+                    report["jobs"] += self._export_jobs_batch(f, items, started)
+
+                    items = [i.decode() for i in items]
+                    self._write_record(f, {"queue": queue, "items": items})
+
+                    report["items"] += len(items)
+                    start = start + len(items)
+
+        return report
+
+    def _export_jobs_batch(
+        self, f, keys: List[Union[str, bytes]], since: Optional[float] = None
+    ) -> int:
+        """Writes the hashes of `keys` to the archive. If `since` is given,
+        only the hashes not indexed or indexed after `since` are written.
+        """
+        jobs = self._export_jobs(keys)
+        if since is not None:
+            jobs = [j for j in jobs if j["score"] is None or j["score"] >= since]
+
+        if jobs:
+            self._write_record(f, {"jobs": jobs})
+
+        return len(jobs)
+
+    def _export_jobs(self, keys: List[Union[str, bytes]]) -> List[dict]:
+        pipe = self.r.pipeline(transaction=False)
+        for key in keys:
+            pipe.hgetall(key)
+            pipe.pttl(key)
+
+        results = pipe.execute()
+
+        jobs = []
+        for i, key in enumerate(keys):
+            fields, ttl = results[2 * i], results[2 * i + 1]
+            if not fields:
+                continue
+
+            key = key.decode() if isinstance(key, bytes) else key
+            fields = {k.decode(): v.decode() for k, v in fields.items()}
+            jobs.append({"key": key, "fields": fields, "ttl": ttl})
+
+        pipe = self.r.pipeline(transaction=False)
+        for job in jobs:
+            status = job["fields"].get("status", "")
+            pipe.zscore(self.status_index(status), job["key"])
+
+        for job, score in zip(jobs, pipe.execute()):
+            job["score"] = score
+
+        return jobs
+
+    @staticmethod
+    def _write_record(f, record: dict):
+        f.write(json.dumps(record, separators=(",", ":")))
+        f.write("\n")
+
+    def import_(self, path: os.PathLike) -> dict:
+        """Restores an archive created with `export`. Each chunk is written
+        in a single pipeline, and items are appended to the queues in their
+        original order. The size of the queues is computed from the hashes
+        restored before their items.
+
+        Arguments:
+            path (str): path of the archive
+
+        Returns:
+            report (dict): number of imported queues, items and jobs
+        """
+        report = {"queues": 0, "items": 0, "jobs": 0}
+        queues = set()
+
+        with gzip.open(path, "rt") as f:
+            header = json.loads(f.readline())
+            if header.get("format") != ARCHIVE_FORMAT:
+                raise EngineError(f"{path} is not an archive of Redis queues")
+
+            if header.get("version") != ARCHIVE_VERSION:
+                version = header.get("version")
+                raise EngineError(f"Unsupported version {version} of archive {path}")
+
+            for line in f:
+                record = json.loads(line)
+
+                if "jobs" in record:
+                    self._import_jobs(record["jobs"])
+                    report["jobs"] += len(record["jobs"])
+                    continue
+
+                queue, items = record["queue"], record["items"]
+
+                size = self._items_size(items)
+
+                pipe = self.r.pipeline(transaction=False)
+                pipe.rpush(queue, *items)
+                pipe.incrby(self.bytes_key(queue), size)
+                pipe.execute()
+
+                queues.add(queue)
+                report["items"] += len(items)
+
+        report["queues"] = len(queues)
+        return report
+
+    def _import_jobs(self, jobs: List[dict]):
+        """Writes the job hashes in a pipeline"""
+        now = time.time()
+
+        pipe = self.r.pipeline(transaction=False)
+        for job in jobs:
+            key, fields = job["key"], job["fields"]
+            pipe.hset(key, mapping=fields)
+
+            if job.get("ttl", -1) > 0:
+                pipe.pexpire(key, job["ttl"])
+
+            status = fields.get("status")
+            if status is not None:
+                score = job.get("score") or now
+                pipe.zadd(self.status_index(status), {key: score})
+                pipe.sadd(STATUS_REGISTRY, status)
+
+        pipe.execute()
+
+    def gc(self, batch_size: int = 1000, dry_run: bool = False) -> dict:
+        """Incrementally applies the status TTLs to job hashes that do not
+        expire yet. Hashes whose status was updated longer ago than their
+        TTL, according to the status index, are deleted right away. The
+        keyspace is traversed with SCAN, so the server is never blocked for
+        more than one batch. The size counters of the queues are then
+        recomputed, as hashes that expire while queued leave them too large.
+
+        Arguments:
+            batch_size (int): number of keys inspected per SCAN/pipeline call
+            dry_run (bool): if True, only reports what would be reclaimed
+
+        Returns:
+            report (dict): number of scanned, expiring and deleted hashes,
+                the memory reclaimed by the deletions (in bytes), the
+                number of expired keys pruned from the status index and the
+                number of queues whose size counter was corrected.
+        """
+        report = {
+            "scanned": 0,
+            "expiring": 0,
+            "deleted": 0,
+            "reclaimed_bytes": 0,
+            "pruned": 0,
+            "recounted": 0,
+        }
+
+        batch = []
+        for key in self.r.scan_iter(count=batch_size, _type="hash"):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                self._gc_batch(batch, report, dry_run)
+                batch = []
+
+        if batch:
+            self._gc_batch(batch, report, dry_run)
+
+        for status in self.r.smembers(STATUS_REGISTRY):
+            self._prune_index(status.decode(), batch_size, report, dry_run)
+
+        for queue in self.list_queue_names():
+            self._recount(queue, batch_size, report, dry_run)
+
+        return report
+
+    def _recount(self, queue: str, batch_size: int, report: dict, dry_run: bool):
+        """Recomputes the size counter of `queue` from the messages of its
+        items, in a transaction that is retried if the queue changes.
+        """
+        queue = self.format_queue_name(queue)
+        bytes_key = self.bytes_key(queue)
+        sizes = []
+
+        def _count():
+            size = 0
+            for start in range(0, self.r.llen(queue), batch_size):
+                keys = self.r.lrange(queue, start, start + batch_size - 1)
+                size += self._items_size(keys)
+
+            sizes[:] = [int(self.r.get(bytes_key) or 0), size]
+
+        def _set(pipe, _):
+            old, size = sizes
+            if old == size:
+                return False
+
+            if not dry_run:
+                pipe.set(bytes_key, size)
+
+            return True
+
+        changed, _ = self._watch_statuses(
+            [], _set, watch=[queue, bytes_key], check=_count
+        )
+        report["recounted"] += int(changed)
+
+    def _prune_index(self, status: str, batch_size: int, report: dict, dry_run: bool):
+        """Removes the keys of expired hashes from the index of `status`"""
+        index = self.status_index(status)
+
+        batch = []
+        for key, _ in self.r.zscan_iter(index, count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                self._prune_batch(index, batch, report, dry_run)
+                batch = []
+
+        if batch:
+            self._prune_batch(index, batch, report, dry_run)
+
+    def _prune_batch(self, index: str, keys: List[bytes], report: dict, dry_run: bool):
+        pipe = self.r.pipeline(transaction=False)
+        for key in keys:
+            pipe.exists(key)
+
+        missing = [k for k, e in zip(keys, pipe.execute()) if not e]
+        report["pruned"] += len(missing)
+
+        if missing and not dry_run:
+            self.r.zrem(index, *missing)
+
+    def _gc_batch(self, keys: List[bytes], report: dict, dry_run: bool):
+        pipe = self.r.pipeline(transaction=False)
+        for key in keys:
+            pipe.ttl(key)
+            pipe.memory_usage(key)
+            pipe.hget(key, "status")
+
+        results = pipe.execute(raise_on_error=False)
+        report["scanned"] += len(keys)
+
+        # only hashes following RedisInfoSchema, without expiration and
+        # whose status has a TTL
+        candidates = []
+        for i, key in enumerate(keys):
+            current_ttl, usage, status = results[3 * i : 3 * i + 3]
+            if not isinstance(status, bytes) or current_ttl != -1:
+                continue
+
+            status = status.decode()
+            ttl = self.get_status_ttl(status)
+            if ttl is None:
+                continue
+
+            usage = usage if isinstance(usage, int) else 0
+            candidates.append((key, status, ttl, usage))
+
+        # the age of a status is given by the score of the hash in the index
+        pipe = self.r.pipeline(transaction=False)
+        for key, status, _, _ in candidates:
+            pipe.zscore(self.status_index(status), key)
+
+        now = time.time()
+        scores = pipe.execute()
+
+        expired = []
+        pipe = self.r.pipeline(transaction=False)
+        for (key, status, ttl, usage), score in zip(candidates, scores):
+            age = 0 if score is None else max(int(now - score), 0)
+            if age >= ttl:
+                expired.append((key, status, ttl, usage))
+            else:
+                pipe.expire(key, ttl - age)
+                report["expiring"] += 1
+
+        if dry_run:
+            report["deleted"] += len(expired)
+            report["reclaimed_bytes"] += sum(usage for *_, usage in expired)
+            return
+
+        pipe.execute()
+
+        if expired:
+            self._gc_delete(expired, report)
+
+    def _gc_delete(self, expired: list, report: dict):
+        """Deletes the `expired` hashes in a transaction, skipping the ones
+        whose status was updated since they were inspected.
+        """
+        keys = [key for key, *_ in expired]
+        scores = []
+
+        def _get_scores():
+            pipe = self.r.pipeline(transaction=False)
+            for key, status, _, _ in expired:
+                pipe.zscore(self.status_index(status), key)
+
+            scores[:] = pipe.execute()
+
+        def _delete(pipe, current):
+            now = time.time()
+            deleted = []
+            for (key, status, ttl, usage), old, score in zip(expired, current, scores):
+                age = 0 if score is None else now - score
+                if old != status or age < ttl:
+                    continue
+
+                pipe.delete(key)
+                pipe.zrem(self.status_index(status), key)
+                deleted.append(usage)
+
+            return deleted
+
+        deleted, _ = self._watch_statuses(keys, _delete, check=_get_scores)
+        report["deleted"] += len(deleted)
+        report["reclaimed_bytes"] += sum(deleted)
 
 
 class RedisProducer(RedisEngine, BaseProducer):
     def push(self, queue: str, item: str, left: bool = True):
+        return self._retry_full(
+            lambda: self._push_item(queue, item, nbytes(item), left=left)
+        )
+
+    def _push(self, r, queue: str, item: str, left: bool = True):
         queue = self.format_queue_name(queue)
         if left:
-            return self.r.lpush(queue, item)
-        return self.r.rpush(queue, item)
+            return r.lpush(queue, item)
+        return r.rpush(queue, item)
+
+    def _push_item(
+        self,
+        queue: str,
+        item: str,
+        size: int,
+        left: bool = True,
+        keys: List[str] = (),
+        fn: Optional[Callable] = None,
+    ):
+        """Pushes `item` to `queue` within `_watch_statuses`, also running
+        `fn(pipe, statuses)` for the given `keys`. If the queue is bounded,
+        its capacity is checked while the queue is watched, so concurrent
+        producers cannot exceed the limits.
+        """
+        queue = self.format_queue_name(queue)
+        bytes_key = self.bytes_key(queue)
+        dropped = []
+
+        def _check():
+            dropped[:] = self._check_capacity(queue, size, left)
+
+        def _push(pipe, current):
+            if fn is not None:
+                fn(pipe, current)
+
+            self._drop(pipe, queue, dropped, left)
+            pipe.incrby(bytes_key, size)
+            self._push(pipe, queue, item, left)
+
+        watch, check = [], None
+        if self.has_limits:
+            watch, check = [queue, bytes_key], _check
+
+        _, results = self._watch_statuses(list(keys), _push, watch, check)
+        return results[-1]
+
+    def _check_capacity(self, queue: str, size: int, left: bool = True) -> list:
+        """Returns the (key, status, size) of the oldest items that have to
+        be dropped to fit a new item of `size` in the queue. Raises a
+        QueueFullError if the queue is full and items cannot be dropped.
+        """
+        length, used = self.queue_depth(queue)
+
+        dropped = []
+        while self.exceeds_limits(length - len(dropped), used, 1, size):
+            if self.overflow != OverflowPolicy.drop_oldest or len(dropped) == length:
+                raise QueueFullError(f"Queue {queue} is full")
+
+            # oldest items are at the opposite end of the pushes
+            idx = -1 - len(dropped) if left else len(dropped)
+            key = self.r.lindex(queue, idx)
+            item_size = self.r.hstrlen(key, "msg") or nbytes(key)
+
+            used = used - item_size
+            dropped.append((key, item_size))
+
+        statuses = self._get_statuses([key for key, _ in dropped])
+        return [(key, st, sz) for (key, sz), st in zip(dropped, statuses)]
+
+    def _drop(self, pipe, queue: str, dropped: list, left: bool = True):
+        for key, status, size in dropped:
+            if left:
+                pipe.rpop(queue)
+            else:
+                pipe.lpop(queue)
+
+            if status is not None:
+                pipe.zrem(self.status_index(status), key)
+                pipe.delete(key)
+
+            pipe.decrby(self.bytes_key(queue), size)
 
     def push_info(
         self,
@@ -118,15 +900,63 @@ class RedisProducer(RedisEngine, BaseProducer):
         status=Status.READY.value,
     ):
         msg = info.encode()
-        key = str(info.uuid)
+        key = self.job_key(queue, str(info.uuid))
+
+        if isinstance(status, Status):
+            status = status.value
 
         data = RedisInfoSchema(
             msg=msg,
             status=status,
         )
 
-        self.r.hset(key, mapping=data)
-        return self.push(queue, key)
+        def _push_info(pipe, current):
+            pipe.hset(key, mapping=data)
+            self._index_status(pipe, key, status, current[0])
+            self._expire_status(pipe, key, status)
+
+        return self._retry_full(
+            lambda: self._push_item(
+                queue, key, nbytes(msg), keys=[key], fn=_push_info
+            )
+        )
+
+    def push_info_many(
+        self,
+        queue: str,
+        infos: List[Union[JobInfo, JobResults]],
+        status=Status.READY.value,
+    ) -> List[str]:
+        """Adds several JobInfo to the queue in a single transaction. Bounded
+        queues check their capacity for each job instead. Returns the keys
+        of the jobs.
+        """
+        keys = [self.job_key(queue, str(info.uuid)) for info in infos]
+
+        if self.has_limits:
+            for info in infos:
+                self.push_info(queue, info, status=status)
+
+            return keys
+
+        if isinstance(status, Status):
+            status = status.value
+
+        msgs = [info.encode() for info in infos]
+
+        def _push_infos(pipe, current):
+            for key, msg, old in zip(keys, msgs, current):
+                pipe.hset(key, mapping=RedisInfoSchema(msg=msg, status=status))
+                self._index_status(pipe, key, status, old)
+                self._expire_status(pipe, key, status)
+                self._push(pipe, queue, key)
+
+            pipe.incrby(self.bytes_key(queue), sum(nbytes(msg) for msg in msgs))
+
+        if infos:
+            self._watch_statuses(keys, _push_infos)
+
+        return keys
 
 
 class RedisConsumer(RedisEngine, BaseConsumer):
@@ -135,7 +965,93 @@ class RedisConsumer(RedisEngine, BaseConsumer):
             return None, None
 
         queue = self.format_queue_name(queue)
-        key = self.r.lpop(queue).decode()
-        msg = self.r.hget(key, "msg")
+        key = self.r.lpop(queue)
+        if key is None:
+            return None, None
+
+        pipe = self.r.pipeline()
+        pipe.hget(key, "msg")
+        if self.consumed_ttl is not None:
+            pipe.expire(key, self.consumed_ttl)
+
+        msg = pipe.execute()[0]
+        self.r.decrby(self.bytes_key(queue), nbytes(key if msg is None else msg))
+
+        return key.decode(), msg
+
+    def get_n(self, queue: str, n: int = 1000, batch_size: int = 100) -> (str, str):
+        """Get `n` items from the queue. Keys are popped `batch_size` at a
+        time and their messages are fetched in a single pipeline. Keys
+        popped but not yielded (e.g. if the iteration stops early) are
+        pushed back to the head of the queue.
+        """
+        queue = self.format_queue_name(queue)
+
+        remaining = n
+        while remaining > 0:
+            keys = self.r.lpop(queue, min(batch_size, remaining))
+            if not keys:
+                break
+
+            pipe = self.r.pipeline(transaction=False)
+            for key in keys:
+                pipe.hget(key, "msg")
+
+            msgs = pipe.execute()
+
+            consumed = 0
+            try:
+                for key, msg in zip(keys, msgs):
+                    consumed = consumed + 1
+                    yield key.decode(), msg
+
+            finally:
+                self._consume(queue, keys[:consumed], msgs[:consumed])
+                self._push_back(queue, keys[consumed:])
+
+            remaining = remaining - len(keys)
+
+        return None, None
+
+    def requeue(self, queue: str, keys: List[str]):
+        """Pushes keys obtained with `get` or `get_n` back to the head of the
+        queue, in order. Their `consumed_ttl` is replaced by the TTL of
+        their status, if any.
+        """
+        if not keys:
+            return
+
+        queue = self.format_queue_name(queue)
+
+        size = self._items_size(keys)
+        statuses = self._get_statuses(keys)
+
+        pipe = self.r.pipeline()
+        if self.consumed_ttl is not None:
+            for key, status in zip(keys, statuses):
+                self._expire_status(pipe, key, status)
+
+        pipe.lpush(queue, *reversed(keys))
+        pipe.incrby(self.bytes_key(queue), size)
+        pipe.execute()
+
+    def _consume(self, queue: str, keys: List[bytes], msgs: List[Optional[bytes]]):
+        """Updates the size of `queue` and expires the hashes of the popped
+        `keys` if `consumed_ttl` is set.
+        """
+        if not keys:
+            return
+
+        pipe = self.r.pipeline()
+        if self.consumed_ttl is not None:
+            for key in keys:
+                pipe.expire(key, self.consumed_ttl)
+
+        size = sum(nbytes(key if msg is None else msg) for key, msg in zip(keys, msgs))
+        pipe.decrby(self.bytes_key(queue), size)
+        pipe.execute()
 
-        return key, msg
+    def _push_back(self, queue: str, keys: List[bytes]):
+        """Pushes popped `keys` back to the head of `queue`, in order"""
+        if keys:
+            self.r.lpush(queue, *reversed(keys))
@@ -1,4 +1,5 @@
 import os
+from typing import Optional
 from mkite_core.external import load_config
 from pydantic import Field, DirectoryPath, FilePath
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -8,6 +9,24 @@ class EngineSettings(BaseSettings):
     """Wraps and obtains all settings for the environmental variables"""
     model_config = SettingsConfigDict(case_sensitive=False)
 
+    max_queue_length: Optional[int] = Field(
+        None,
+        description="maximum number of items in each queue",
+    )
+    max_queue_bytes: Optional[int] = Field(
+        None,
+        description="maximum size (in bytes) of the items in each queue",
+    )
+    overflow: str = Field(
+        "reject",
+        description="what to do when pushing to a full queue: "
+        + "block, reject or drop_oldest",
+    )
+    block_timeout: float = Field(
+        10.0,
+        description="time (in seconds) to wait for a full queue when blocking",
+    )
+
     @classmethod
     def from_file(cls, filename: FilePath):
         data = load_config(filename)
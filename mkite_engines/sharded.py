@@ -0,0 +1,401 @@
+import bisect
+import hashlib
+
+from typing import List, Dict, Tuple, Union, Optional
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import ConfigDict, Field
+from mkite_core.models import JobInfo, JobResults, Status
+
+from .base import BaseEngine, BaseProducer, BaseConsumer, QueueDepth
+from .redis import (
+    RedisEngineSettings,
+    RedisEngine,
+    RedisProducer,
+    RedisConsumer,
+    STATUS_REGISTRY,
+)
+
+
+class ShardedEngineSettings(RedisEngineSettings):
+    endpoints: List[str] = Field(
+        ["localhost:6379"],
+        description="list of `host:port` of the Redis servers",
+    )
+    replicas: int = Field(
+        64,
+        description="number of points of each server in the hash ring",
+    )
+    model_config = ConfigDict(env_prefix="REDIS_", case_sensitive=False)
+
+
+def hash_tag(key: str) -> str:
+    """Returns the part of `key` used for placement, following the hash tag
+    rules of Redis Cluster: if the key contains a non-empty `{...}`
+    section, only the content of the first one is hashed.
+    """
+    start = key.find("{")
+    if start == -1:
+        return key
+
+    end = key.find("}", start + 1)
+    if end == -1 or end == start + 1:
+        return key
+
+    return key[start + 1 : end]
+
+
+class HashRing:
+    """Consistent hashing ring placing keys among nodes. Each node is
+    represented by `replicas` points in the ring, so that adding or
+    removing a node only relocates about 1/N of the keys.
+    """
+
+    def __init__(self, nodes: List[str] = (), replicas: int = 64):
+        self.replicas = replicas
+        self._points = []
+        self._nodes = {}
+
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def hash(value: str) -> int:
+        digest = hashlib.md5(value.encode()).digest()
+        return int.from_bytes(digest[:8], "big")
+
+    @property
+    def nodes(self) -> List[str]:
+        return sorted(set(self._nodes.values()))
+
+    def add(self, node: str):
+        for i in range(self.replicas):
+            point = self.hash(f"{node}#{i}")
+            bisect.insort(self._points, point)
+            self._nodes[point] = node
+
+    def remove(self, node: str):
+        points = [p for p, n in self._nodes.items() if n == node]
+        for point in points:
+            self._points.remove(point)
+            del self._nodes[point]
+
+    def get(self, key: str) -> str:
+        if not self._points:
+            raise ValueError("No nodes in the hash ring")
+
+        idx = bisect.bisect(self._points, self.hash(hash_tag(key)))
+        if idx == len(self._points):
+            idx = 0
+
+        return self._nodes[self._points[idx]]
+
+
+class ShardedEngine(BaseEngine):
+    """Engine distributing queues among several Redis servers. Queues are
+    placed by consistent hashing of their names, and job hashes carry the
+    hash tag of their queue, so both always live in the same server.
+    Status indexes are kept by each server for its own jobs.
+    """
+
+    SETTINGS_CLS = ShardedEngineSettings
+    SHARD_CLS = RedisEngine
+
+    def __init__(
+        self,
+        endpoints: List[str],
+        password: str = "abc",
+        queue_prefix: str = "queue:",
+        replicas: int = 64,
+        **kwargs,
+    ):
+        # shards are built from `endpoints` and always use hash tags
+        for k in ["host", "port", "hash_tags"]:
+            kwargs.pop(k, None)
+
+        self.qprefix = queue_prefix
+        self.shard_kwargs = {
+            "password": password,
+            "queue_prefix": queue_prefix,
+            **kwargs,
+        }
+        self.ring = HashRing(replicas=replicas)
+        self.shards = {}
+
+        for endpoint in endpoints:
+            self._add_shard(endpoint)
+
+    def __repr__(self):
+        n = len(self.shards)
+        return f"<{self.__class__.__name__} ({n} shards)>"
+
+    def _add_shard(self, endpoint: str):
+        host, port = endpoint.rsplit(":", 1)
+        self.shards[endpoint] = self.SHARD_CLS(
+            host=host,
+            port=int(port),
+            hash_tags=True,
+            **self.shard_kwargs,
+        )
+        self.ring.add(endpoint)
+
+    def close(self):
+        for shard in self.shards.values():
+            shard.close()
+
+        super().close()
+
+    def shard_for(self, key: str) -> RedisEngine:
+        """Returns the shard where `key` is placed"""
+        return self.shards[self.ring.get(key)]
+
+    def shard_for_queue(self, queue: str) -> RedisEngine:
+        return self.shard_for(self.format_queue_name(queue))
+
+    def _map_shards(self, fn) -> list:
+        """Applies `fn` to all shards in parallel"""
+        shards = list(self.shards.values())
+        with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+            return list(executor.map(fn, shards))
+
+    def list_queue(self, queue: str) -> List[str]:
+        return self.shard_for_queue(queue).list_queue(queue)
+
+    def list_queue_names(self) -> List[str]:
+        names = []
+        for shard_names in self._map_shards(lambda s: s.list_queue_names()):
+            names += [n for n in shard_names if n not in names]
+
+        return names
+
+    def queue_depth(self, queue: str) -> QueueDepth:
+        return self.shard_for_queue(queue).queue_depth(queue)
+
+    def add_queue(self, name: str):
+        """Empty queues do not have to be created in Redis.
+        This method exists for compatibility with other engines.
+        """
+        pass
+
+    def delete(self, key: str):
+        self.shard_for(key).delete(key)
+
+    def delete_many(self, keys: List[str], batch_size: int = 1000):
+        """Deletes several jobs at once, writing to all the shards in
+        parallel. See `RedisEngine.delete_many`.
+        """
+        groups = {}
+        for key in keys:
+            groups.setdefault(self.ring.get(key), []).append(key)
+
+        def _delete(endpoint):
+            self.shards[endpoint].delete_many(groups[endpoint], batch_size)
+
+        with ThreadPoolExecutor(max_workers=max(len(groups), 1)) as executor:
+            list(executor.map(_delete, groups))
+
+    def set_status(self, key: str, status: str = Status.DOING.value):
+        self.shard_for(key).set_status(key, status)
+
+    def set_status_many(
+        self,
+        keys: List[str],
+        status: str = Status.DOING.value,
+        expected: Optional[str] = None,
+        batch_size: int = 1000,
+    ) -> Dict[str, bool]:
+        """Sets the status of several jobs at once, writing to all the
+        shards in parallel. See `RedisEngine.set_status_many`.
+        """
+        groups = {}
+        for key in keys:
+            groups.setdefault(self.ring.get(key), []).append(key)
+
+        def _set_status(endpoint):
+            shard = self.shards[endpoint]
+            return shard.set_status_many(groups[endpoint], status, expected, batch_size)
+
+        outcomes = {}
+        with ThreadPoolExecutor(max_workers=max(len(groups), 1)) as executor:
+            for result in executor.map(_set_status, groups):
+                outcomes.update(result)
+
+        return {key: outcomes[key] for key in keys}
+
+    def list_by_status(
+        self, status: str, cursor: Union[int, str] = 0, count: int = 100
+    ) -> Tuple[Union[int, str], List[str]]:
+        """Lists the keys of the jobs with the given status, one shard at a
+        time. The cursor encodes both the shard and the cursor within its
+        index. See `RedisEngine.list_by_status`.
+        """
+        endpoints = list(self.shards.keys())
+
+        idx, inner = 0, 0
+        if cursor != 0:
+            idx, inner = cursor.split(":", 1)
+            idx, inner = int(idx), inner or 0
+
+        inner, keys = self.shards[endpoints[idx]].list_by_status(status, inner, count)
+
+        if inner != 0:
+            return f"{idx}:{inner}", keys
+
+        if idx + 1 < len(endpoints):
+            return f"{idx + 1}:", keys
+
+        return 0, keys
+
+    def count_by_status(self, prune: bool = False) -> Dict[str, int]:
+        counts = {}
+        for shard_counts in self._map_shards(lambda s: s.count_by_status(prune)):
+            for status, count in shard_counts.items():
+                counts[status] = counts.get(status, 0) + count
+
+        return counts
+
+    def gc(self, batch_size: int = 1000, dry_run: bool = False) -> dict:
+        """Runs the garbage collection of all shards in parallel.
+        See `RedisEngine.gc`.
+        """
+        report = {}
+        reports = self._map_shards(lambda s: s.gc(batch_size, dry_run))
+        for shard_report in reports:
+            for k, v in shard_report.items():
+                report[k] = report.get(k, 0) + v
+
+        return report
+
+    def add_shard(self, endpoint: str, batch_size: int = 1000) -> int:
+        """Adds a new server to the engine and moves to it the keys it
+        now owns. Returns the number of keys moved.
+        """
+        self._add_shard(endpoint)
+        return self.rebalance(batch_size)
+
+    def remove_shard(self, endpoint: str, batch_size: int = 1000) -> int:
+        """Moves all keys of a server to the remaining ones and removes
+        it from the engine. Returns the number of keys moved.
+        """
+        self.ring.remove(endpoint)
+        shard = self.shards[endpoint]
+
+        try:
+            moved = self._rebalance_shard(endpoint, shard, batch_size)
+        finally:
+            del self.shards[endpoint]
+
+        return moved
+
+    def rebalance(self, batch_size: int = 1000) -> int:
+        """Moves the queues and job hashes which are not placed in the shard
+        given by the hash ring. Returns the number of keys moved. Keys are
+        not moved atomically, so producers and consumers should be paused
+        while rebalancing.
+        """
+        moved = 0
+        for endpoint, shard in list(self.shards.items()):
+            moved += self._rebalance_shard(endpoint, shard, batch_size)
+
+        return moved
+
+    def _rebalance_shard(self, endpoint: str, shard: RedisEngine, batch_size: int):
+        moved = 0
+        for key in shard.r.scan_iter(count=batch_size):
+            key = key.decode()
+            if key == STATUS_REGISTRY or key.startswith(shard.status_prefix):
+                continue
+
+            target = self.ring.get(key)
+            if target == endpoint:
+                continue
+
+            self._move_key(key, shard, self.shards[target], batch_size)
+            moved += 1
+
+        return moved
+
+    def _move_key(self, key: str, src: RedisEngine, dst: RedisEngine, batch_size: int):
+        kind = src.r.type(key).decode()
+
+        if kind == "list":
+            self._move_list(key, src, dst, batch_size)
+        elif kind == "hash":
+            self._move_hash(key, src, dst)
+        elif kind == "string":
+            # counters of queue sizes are merged into the destination
+            dst.r.incrby(key, int(src.r.get(key) or 0))
+        else:
+            ttl = src.r.pttl(key)
+            dst.r.restore(key, max(ttl, 0), src.r.dump(key), replace=True)
+
+        src.r.delete(key)
+
+    def _move_list(self, key: str, src: RedisEngine, dst: RedisEngine, batch_size: int):
+        start = 0
+        while True:
+            items = src.r.lrange(key, start, start + batch_size - 1)
+            if not items:
+                break
+
+            dst.r.rpush(key, *items)
+            start = start + len(items)
+
+    def _move_hash(self, key: str, src: RedisEngine, dst: RedisEngine):
+        data = src.r.hgetall(key)
+        ttl = src.r.pttl(key)
+
+        status = data.get(b"status")
+        score = None
+        if status is not None:
+            status = status.decode()
+            score = src.r.zscore(src.status_index(status), key)
+
+        pipe = dst.r.pipeline()
+        pipe.hset(key, mapping=data)
+        if ttl > 0:
+            pipe.pexpire(key, ttl)
+
+        if score is not None:
+            pipe.zadd(dst.status_index(status), {key: score})
+            pipe.sadd(STATUS_REGISTRY, status)
+
+        pipe.execute()
+
+        if score is not None:
+            src.r.zrem(src.status_index(status), key)
+
+
+class ShardedProducer(ShardedEngine, BaseProducer):
+    SHARD_CLS = RedisProducer
+
+    def push(self, queue: str, item: str, left: bool = True):
+        return self.shard_for_queue(queue).push(queue, item, left=left)
+
+    def push_info(
+        self,
+        queue: str,
+        info: Union[JobInfo, JobResults],
+        status=Status.READY.value,
+    ):
+        return self.shard_for_queue(queue).push_info(queue, info, status=status)
+
+    def push_info_many(
+        self,
+        queue: str,
+        infos: List[Union[JobInfo, JobResults]],
+        status=Status.READY.value,
+    ) -> List[str]:
+        return self.shard_for_queue(queue).push_info_many(queue, infos, status=status)
+
+
+class ShardedConsumer(ShardedEngine, BaseConsumer):
+    SHARD_CLS = RedisConsumer
+
+    def get(self, queue: str) -> (str, str):
+        return self.shard_for_queue(queue).get(queue)
+
+    def get_n(self, queue: str, n: int = 1000, batch_size: int = 100) -> (str, str):
+        return self.shard_for_queue(queue).get_n(queue, n, batch_size=batch_size)
+
+    def requeue(self, queue: str, keys: List[str]):
+        self.shard_for_queue(queue).requeue(queue, keys)
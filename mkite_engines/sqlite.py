@@ -0,0 +1,468 @@
+import os
+import time
+import uuid
+import sqlite3
+import threading
+
+from typing import List, Dict, Tuple, Union, Optional
+from contextlib import contextmanager
+from pydantic import Field
+from mkite_core.models import JobInfo, JobResults, Status
+from mkite_engines.settings import EngineSettings
+
+from .base import (
+    BaseEngine,
+    BaseProducer,
+    BaseConsumer,
+    OverflowPolicy,
+    QueueDepth,
+    QueueFullError,
+    nbytes,
+)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queues (
+    name TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    queue TEXT NOT NULL,
+    key TEXT NOT NULL,
+    item BLOB,
+    status TEXT,
+    claimed INTEGER NOT NULL DEFAULT 0,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_items_queue ON items (queue, claimed, id);
+CREATE INDEX IF NOT EXISTS idx_items_status ON items (status, id);
+CREATE INDEX IF NOT EXISTS idx_items_key ON items (key);
+"""
+
+
+class SqliteEngineSettings(EngineSettings):
+    path: str = Field(
+        os.path.expanduser("~/queue.db"),
+        description="path to the SQLite database holding the queues",
+    )
+    timeout: float = Field(
+        30.0,
+        description="time (in seconds) to wait for a lock on the database",
+    )
+
+
+class SqliteEngine(BaseEngine):
+    """Engine to implement a queue system using a SQLite database in WAL
+    mode. Each thread (and process) opens its own connection, and items are
+    claimed atomically, so several consumers can share the same database.
+    """
+
+    SETTINGS_CLS = SqliteEngineSettings
+
+    def __init__(
+        self,
+        path: os.PathLike,
+        timeout: float = 30.0,
+        queue_prefix: str = "queue:",
+        max_queue_length: Optional[int] = None,
+        max_queue_bytes: Optional[int] = None,
+        overflow: str = OverflowPolicy.reject.value,
+        block_timeout: float = 10.0,
+    ):
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.timeout = timeout
+        self.qprefix = queue_prefix
+        self.set_limits(max_queue_length, max_queue_bytes, overflow, block_timeout)
+        self._local = threading.local()
+        self._conns = []
+        self._conns_lock = threading.Lock()
+
+        self.conn.executescript(SCHEMA)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} @ {self.path}>"
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Connection of the current thread. Connections are not shared
+        with forked processes.
+        """
+        if getattr(self._local, "pid", None) != os.getpid():
+            self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+
+        return self._local.conn
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+
+        with self._conns_lock:
+            self._conns.append(conn)
+
+        return conn
+
+    def close(self):
+        """Closes the connections opened by all threads"""
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+            self._local = threading.local()
+
+        for conn in conns:
+            conn.close()
+
+        super().close()
+
+    @contextmanager
+    def transaction(self):
+        """Runs the enclosed statements in a write transaction"""
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    def list_queue(self, queue: str) -> List[str]:
+        queue = self.format_queue_name(queue)
+        rows = self.conn.execute(
+            "SELECT key FROM items WHERE queue = ? AND claimed = 0 ORDER BY id",
+            (queue,),
+        )
+        return [key for key, in rows]
+
+    def queue_depth(self, queue: str) -> QueueDepth:
+        queue = self.format_queue_name(queue)
+        return self._queue_depth(self.conn, queue)
+
+    def _queue_depth(self, conn: sqlite3.Connection, queue: str) -> QueueDepth:
+        length, used = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(item AS BLOB))), 0) "
+            "FROM items WHERE queue = ? AND claimed = 0",
+            (queue,),
+        ).fetchone()
+        return QueueDepth(length, used)
+
+    def list_queue_names(self) -> List[str]:
+        rows = self.conn.execute("SELECT name FROM queues ORDER BY name")
+        return [self.remove_queue_prefix(name) for name, in rows]
+
+    def add_queue(self, name: str):
+        if isinstance(name, Status):
+            name = name.value
+
+        self._add_queue(self.conn, self.format_queue_name(name))
+
+    def _add_queue(self, conn: sqlite3.Connection, queue: str):
+        conn.execute("INSERT OR IGNORE INTO queues (name) VALUES (?)", (queue,))
+
+    def delete(self, key: str):
+        with self.transaction() as conn:
+            if self.is_queue(key):
+                conn.execute("DELETE FROM items WHERE queue = ?", (key,))
+                conn.execute("DELETE FROM queues WHERE name = ?", (key,))
+                return
+
+            id_ = self._resolve(conn, key)
+            if id_ is not None:
+                conn.execute("DELETE FROM items WHERE id = ?", (id_,))
+
+    def delete_many(self, keys: List[str]):
+        """Deletes several items in a single transaction"""
+        with self.transaction() as conn:
+            ids = [self._resolve(conn, key) for key in keys]
+            conn.executemany(
+                "DELETE FROM items WHERE id = ?",
+                [(id_,) for id_ in ids if id_ is not None],
+            )
+
+    def _resolve(self, conn: sqlite3.Connection, key: str) -> Optional[int]:
+        """Finds the row of the item indexed by `key`. Keys are not unique
+        across queues, so rows claimed by a consumer take precedence over
+        unclaimed ones, followed by the most recently updated row.
+        """
+        row = conn.execute(
+            "SELECT id FROM items WHERE key = ? "
+            "ORDER BY claimed DESC, updated DESC, id DESC LIMIT 1",
+            (key,),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def set_status(self, key: str, status: str = Status.DOING.value):
+        self.set_status_many([key], status)
+
+    def set_status_many(
+        self,
+        keys: List[str],
+        status: str = Status.DOING.value,
+        expected: Optional[str] = None,
+    ) -> Dict[str, bool]:
+        """Sets the status of several items in a single transaction.
+
+        Arguments:
+            keys (list): keys of the items to be updated
+            status (str): new status of the items
+            expected (str): if given, only updates the items whose current
+                status is `expected` (compare-and-set).
+
+        Returns:
+            outcomes (dict): whether the status of each key was updated
+        """
+        if isinstance(status, Status):
+            status = status.value
+
+        if isinstance(expected, Status):
+            expected = expected.value
+
+        query = "UPDATE items SET status = ?, updated = ? WHERE id = ?"
+        if expected is not None:
+            query += " AND status = ?"
+
+        outcomes = {}
+        now = time.time()
+        with self.transaction() as conn:
+            for key in keys:
+                id_ = self._resolve(conn, key)
+                if id_ is None:
+                    outcomes[key] = False
+                    continue
+
+                params = (status, now, id_)
+                if expected is not None:
+                    params += (expected,)
+
+                outcomes[key] = conn.execute(query, params).rowcount > 0
+
+        return outcomes
+
+    def list_by_status(
+        self, status: str, cursor: int = 0, count: int = 100
+    ) -> Tuple[int, List[str]]:
+        """Lists the keys of the items with the given status. Works like
+        SCAN: the iteration starts with a cursor equal to 0 and ends when
+        the returned cursor is 0 again.
+        """
+        if isinstance(status, Status):
+            status = status.value
+
+        rows = self.conn.execute(
+            "SELECT id, key FROM items WHERE status = ? AND id > ? "
+            "ORDER BY id LIMIT ?",
+            (status, cursor, count),
+        ).fetchall()
+
+        next_cursor = rows[-1][0] if len(rows) == count else 0
+        return next_cursor, [key for _, key in rows]
+
+    def count_by_status(self) -> Dict[str, int]:
+        rows = self.conn.execute(
+            "SELECT status, COUNT(*) FROM items "
+            "WHERE status IS NOT NULL GROUP BY status ORDER BY status"
+        )
+        return dict(rows.fetchall())
+
+
+class SqliteProducer(SqliteEngine, BaseProducer):
+    """Producer that inserts items in a SQLite database"""
+
+    def push(self, queue: str, item: Union[str, bytes], key: Optional[str] = None):
+        """Adds the given item to the queue. If no `key` is given, a new
+        one is generated. Returns the key of the item.
+        """
+        key = str(uuid.uuid4()) if key is None else key
+        self.push_many(queue, [(key, item)])
+        return key
+
+    def push_many(
+        self,
+        queue: str,
+        items: List[Tuple[str, Union[str, bytes]]],
+        status: Optional[str] = None,
+    ):
+        """Adds several (key, item) pairs to the queue in a single
+        transaction.
+        """
+        if isinstance(status, Status):
+            status = status.value
+
+        return self._retry_full(lambda: self._push_many(queue, items, status))
+
+    def _push_many(self, queue: str, items: list, status: Optional[str]):
+        queue = self.format_queue_name(queue)
+        now = time.time()
+
+        with self.transaction() as conn:
+            self._add_queue(conn, queue)
+            if self.has_limits:
+                size = sum(nbytes(item) for _, item in items)
+                self._make_room(conn, queue, len(items), size)
+
+            conn.executemany(
+                "INSERT INTO items (queue, key, item, status, updated) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(queue, key, item, status, now) for key, item in items],
+            )
+
+    def push_info(
+        self,
+        queue: str,
+        info: Union[JobInfo, JobResults],
+        status=Status.READY.value,
+    ):
+        return self.push_info_many(queue, [info], status=status)[0]
+
+    def push_info_many(
+        self,
+        queue: str,
+        infos: List[Union[JobInfo, JobResults]],
+        status=Status.READY.value,
+    ) -> List[str]:
+        """Adds several JobInfo to the queue in a single transaction.
+        Returns the keys of the items.
+        """
+        items = [(str(info.uuid), info.encode()) for info in infos]
+        self.push_many(queue, items, status=status)
+        return [key for key, _ in items]
+
+    def _make_room(self, conn: sqlite3.Connection, queue: str, n: int, size: int):
+        """Ensures `n` items of total `size` fit in the queue, dropping its
+        oldest items if allowed. Raises a QueueFullError otherwise, which
+        rolls back the transaction.
+        """
+        length, used = self._queue_depth(conn, queue)
+        if not self.exceeds_limits(length, used, n, size):
+            return
+
+        if self.overflow != OverflowPolicy.drop_oldest:
+            raise QueueFullError(f"Queue {queue} is full")
+
+        rows = conn.execute(
+            "SELECT id, COALESCE(LENGTH(CAST(item AS BLOB)), 0) FROM items "
+            "WHERE queue = ? AND claimed = 0 ORDER BY id",
+            (queue,),
+        )
+
+        last, dropped = None, 0
+        for id_, item_size in rows:
+            if not self.exceeds_limits(length - dropped, used, n, size):
+                break
+
+            last, dropped, used = id_, dropped + 1, used - item_size
+
+        if self.exceeds_limits(length - dropped, used, n, size):
+            raise QueueFullError(f"Queue {queue} is full")
+
+        if last is not None:
+            conn.execute(
+                "DELETE FROM items WHERE queue = ? AND claimed = 0 AND id <= ?",
+                (queue, last),
+            )
+
+
+class SqliteConsumer(SqliteEngine, BaseConsumer):
+    """Consumer that claims items from a SQLite database"""
+
+    def get(self, queue: str) -> (str, str):
+        """Claims the oldest item of the queue"""
+        rows = self._claim(queue, 1)
+
+        if len(rows) == 0:
+            return None, None
+
+        _, key, item = rows[0]
+        return key, item
+
+    def get_n(self, queue: str, n: int = 1000) -> (str, str):
+        """Claims the `n` oldest items of the queue in a single transaction.
+        If the iteration stops early, the claims on the items not yet
+        yielded are released.
+        """
+        rows = self._claim(queue, n)
+        yielded = 0
+        try:
+            for _, key, item in rows:
+                yielded += 1
+                yield key, item
+        finally:
+            if yielded < len(rows):
+                self._release([id_ for id_, _, _ in rows[yielded:]])
+
+        return None, None
+
+    def pop(self, queue: str) -> (str, str):
+        """Removes the oldest item of the queue"""
+        rows = self.pop_n(queue, 1)
+
+        if len(rows) == 0:
+            return None, None
+
+        return rows[0]
+
+    def requeue(self, queue: str, keys: List[str]):
+        """Releases the claims on items obtained with `get` or `get_n`. The
+        items return to their original position in the queue.
+        """
+        queue = self.format_queue_name(queue)
+
+        with self.transaction() as conn:
+            conn.executemany(
+                "UPDATE items SET claimed = 0, updated = ? "
+                "WHERE queue = ? AND key = ? AND claimed = 1",
+                [(time.time(), queue, key) for key in keys],
+            )
+
+    def _release(self, ids: List[int]):
+        with self.transaction() as conn:
+            conn.executemany(
+                "UPDATE items SET claimed = 0, updated = ? "
+                "WHERE id = ? AND claimed = 1",
+                [(time.time(), id_) for id_ in ids],
+            )
+
+    def _claim(self, queue: str, n: int) -> List[Tuple[int, str, str]]:
+        queue = self.format_queue_name(queue)
+
+        with self.transaction() as conn:
+            rows = self._select_oldest(conn, queue, n)
+            conn.executemany(
+                "UPDATE items SET claimed = 1, updated = ? WHERE id = ?",
+                [(time.time(), id_) for id_, _, _ in rows],
+            )
+
+        return rows
+
+    def pop_n(self, queue: str, n: int = 1000) -> List[Tuple[str, str]]:
+        """Removes the `n` oldest items of the queue in a single
+        transaction, returning their (key, item) pairs.
+        """
+        queue = self.format_queue_name(queue)
+
+        with self.transaction() as conn:
+            rows = self._select_oldest(conn, queue, n)
+            conn.executemany(
+                "DELETE FROM items WHERE id = ?",
+                [(id_,) for id_, _, _ in rows],
+            )
+
+        return [(key, item) for _, key, item in rows]
+
+    def _select_oldest(self, conn: sqlite3.Connection, queue: str, n: int) -> list:
+        """Selects the `n` oldest unclaimed items of the queue. Runs within
+        a write transaction, so the rows cannot be claimed concurrently
+        before they are updated. `UPDATE ... RETURNING` is avoided, as it
+        requires SQLite 3.35.
+        """
+        return conn.execute(
+            "SELECT id, key, item FROM items WHERE queue = ? AND claimed = 0 "
+            "ORDER BY id LIMIT ?",
+            (queue, n),
+        ).fetchall()
@@ -1,6 +1,7 @@
 import os
 import unittest as ut
 from unittest.mock import patch
+from tempfile import TemporaryDirectory
 from pkg_resources import resource_filename
 
 from mkite_core.models import Status
@@ -9,9 +10,11 @@ from mkite_engines.settings import EngineSettings
 from mkite_engines.local import LocalProducer, LocalConsumer
 
 from mkite_engines.instantiate import (
+    ENGINE_CACHE,
     get_engine_class,
     instantiate_from_dict,
     instantiate_from_path,
+    load_config_cached,
 )
 
 SETTINGS_PATH = resource_filename("mkite_engines.tests.configs", "local.yaml")
@@ -42,3 +45,40 @@ class TestInstantiate(ut.TestCase):
     def test_from_path(self):
         obj = instantiate_from_path(SETTINGS_PATH, EngineRoles.producer)
         self.assertIsInstance(obj, LocalProducer)
+
+    def test_cached(self):
+        settings = self.get_local_dict()
+        obj = instantiate_from_dict(settings, EngineRoles.producer, cached=True)
+        same = instantiate_from_dict(settings, EngineRoles.producer, cached=True)
+        self.assertIs(obj, same)
+
+        other = instantiate_from_dict(settings, EngineRoles.consumer, cached=True)
+        self.assertIsInstance(other, LocalConsumer)
+
+        new = instantiate_from_dict(settings, EngineRoles.producer)
+        self.assertIsNot(obj, new)
+
+        ENGINE_CACHE.evict(obj)
+        new = instantiate_from_dict(settings, EngineRoles.producer, cached=True)
+        self.assertIsNot(obj, new)
+
+        ENGINE_CACHE.clear()
+        self.assertEqual(len(ENGINE_CACHE), 0)
+
+    def test_load_config_cached(self):
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "engine.yaml")
+            with open(path, "w") as f:
+                f.write(f"_module: {self.module}\n")
+
+            with patch("mkite_engines.instantiate.load_config") as mock:
+                mock.return_value = {"_module": self.module}
+                load_config_cached(path)
+                load_config_cached(path)
+
+                mtime = os.stat(path).st_mtime_ns
+                os.utime(path, ns=(mtime, mtime + 1))
+                data = load_config_cached(path)
+
+        self.assertEqual(mock.call_count, 2)
+        self.assertEqual(data, {"_module": self.module})
@@ -0,0 +1,40 @@
+import sys
+import subprocess
+import unittest as ut
+
+
+def imported_modules(statement: str) -> set:
+    code = f"import sys; {statement}; print(' '.join(sys.modules))"
+    out = subprocess.check_output([sys.executable, "-c", code])
+    return set(out.decode().split())
+
+
+class TestLazyImports(ut.TestCase):
+    def test_package(self):
+        modules = imported_modules("import mkite_engines")
+        self.assertNotIn("mkite_engines.base", modules)
+        self.assertNotIn("mkite_engines.redis", modules)
+
+    def test_local(self):
+        modules = imported_modules("import mkite_engines; mkite_engines.LocalProducer")
+        self.assertIn("mkite_engines.local", modules)
+        self.assertNotIn("mkite_engines.redis", modules)
+
+        modules = imported_modules("import mkite_engines; mkite_engines.PUBLISHERS['local']")
+        self.assertIn("mkite_engines.local", modules)
+        self.assertNotIn("mkite_engines.redis", modules)
+
+    def test_registries(self):
+        import mkite_engines
+        from mkite_engines.local import LocalConsumer
+
+        self.assertEqual(mkite_engines.CONSUMERS["local"], LocalConsumer)
+        self.assertEqual(list(mkite_engines.ENGINES), ["local", "redis", "sharded", "sqlite"])
+
+        with self.assertRaises(AttributeError):
+            mkite_engines.NotAnEngine
+
+    def test_kiteng(self):
+        modules = imported_modules("from mkite_engines.cli.kiteng import kiteng")
+        self.assertNotIn("mkite_engines.cli.redis", modules)
+        self.assertNotIn("mkite_engines.redis", modules)
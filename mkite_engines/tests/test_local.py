@@ -0,0 +1,196 @@
+import os
+import time
+import unittest as ut
+from unittest.mock import patch
+from tempfile import TemporaryDirectory
+
+from mkite_core.models import Status
+from mkite_engines.base import QueueFullError
+from mkite_engines.local import (
+    LocalEngine,
+    LocalProducer,
+    LocalConsumer,
+    path_size,
+)
+
+
+class TestLocalStatusMany(ut.TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.engine = LocalEngine(self.tmp.name)
+        self.engine.add_queue(Status.READY.value)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_items(self, n: int):
+        queue = self.engine.format_queue_name(Status.READY.value)
+        keys = []
+        for i in range(n):
+            key = os.path.join(queue, f"{i}.json")
+            with open(self.engine.abspath(key), "w") as f:
+                f.write("{}")
+
+            keys.append(key)
+
+        return keys
+
+    def test_set_status_many(self):
+        keys = self.make_items(5)
+
+        outcomes = self.engine.set_status_many(keys, Status.DONE.value)
+        self.assertEqual(outcomes, {k: True for k in keys})
+        self.assertEqual(self.engine.list_queue(Status.READY.value), [])
+
+        expected = sorted(os.path.basename(k) for k in keys)
+        returned = sorted(self.engine.list_queue(Status.DONE.value))
+        self.assertEqual(returned, expected)
+
+    def test_set_status_many_missing(self):
+        keys = self.make_items(2)
+        missing = os.path.join(self.engine.format_queue_name("ready"), "missing")
+
+        outcomes = self.engine.set_status_many(keys + [missing], Status.DONE.value)
+        self.assertEqual(outcomes, {keys[0]: True, keys[1]: True, missing: False})
+
+    def test_set_status_many_expected(self):
+        keys = self.make_items(3)
+        self.engine.set_status_many(keys[:1], Status.ERROR.value)
+        moved = os.path.join(
+            self.engine.format_queue_name(Status.ERROR.value),
+            os.path.basename(keys[0]),
+        )
+
+        outcomes = self.engine.set_status_many(
+            [moved] + keys[1:],
+            Status.DOING.value,
+            expected=Status.READY.value,
+        )
+        self.assertEqual(outcomes, {moved: False, keys[1]: True, keys[2]: True})
+        self.assertEqual(self.engine.list_queue(Status.ERROR.value), ["0.json"])
+
+        # items already moved by another worker are not moved twice
+        outcomes = self.engine.set_status_many(
+            keys[1:2], Status.DONE.value, expected=Status.READY.value
+        )
+        self.assertEqual(outcomes, {keys[1]: False})
+        self.assertEqual(self.engine.list_queue(Status.DONE.value), [])
+
+
+class TestLocalLimits(ut.TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.src = os.path.join(self.tmp.name, "src")
+        os.mkdir(self.src)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def get_engines(self, **kwargs):
+        root = os.path.join(self.tmp.name, "root")
+        prod = LocalProducer(root, **kwargs)
+        cons = LocalConsumer(root, delay=0)
+        return prod, cons
+
+    def make_item(self, name: str, size: int = 10):
+        path = os.path.join(self.src, name)
+        with open(path, "w") as f:
+            f.write("x" * size)
+
+        return path
+
+    def test_queue_depth(self):
+        prod, cons = self.get_engines(max_queue_length=10)
+        prod.push("test", self.make_item("a", 10))
+        prod.push("test", self.make_item("b", 20))
+        self.assertEqual(prod.queue_depth("test"), (2, 30))
+
+        prod.push("test", self.make_item("c", 5))
+        self.assertEqual(prod.queue_depth("test"), (3, 35))
+
+        # items removed by other processes are seen once the counter expires
+        cons.delete(os.path.join(cons.get_queue_path("test"), "a"))
+        self.assertEqual(prod.queue_depth("test"), (3, 35))
+
+        with patch("mkite_engines.local.DEPTH_CACHE_TTL", 0):
+            self.assertEqual(prod.queue_depth("test"), (2, 25))
+
+    def test_reject(self):
+        prod, _ = self.get_engines(max_queue_length=2)
+        prod.push("test", self.make_item("a"))
+        prod.push("test", self.make_item("b"))
+
+        with self.assertRaises(QueueFullError):
+            prod.push("test", self.make_item("c"))
+
+        self.assertEqual(sorted(prod.list_queue("test")), ["a", "b"])
+
+        prod, _ = self.get_engines(max_queue_bytes=15)
+        with self.assertRaises(QueueFullError):
+            prod.push("other", self.make_item("d", 20))
+
+        self.assertEqual(prod.queue_depth("other"), (0, 0))
+
+    def test_block(self):
+        prod, cons = self.get_engines(
+            max_queue_length=1, overflow="block", block_timeout=0.2
+        )
+        prod.push("test", self.make_item("a"))
+
+        with self.assertRaises(QueueFullError):
+            prod.push("test", self.make_item("b"))
+
+        cons.delete(os.path.join(cons.get_queue_path("test"), "a"))
+        with patch("mkite_engines.local.DEPTH_CACHE_TTL", 0):
+            prod.push("test", self.make_item("b"))
+
+        self.assertEqual(prod.list_queue("test"), ["b"])
+
+    def test_drop_oldest(self):
+        prod, _ = self.get_engines(max_queue_length=2, overflow="drop_oldest")
+
+        now = time.time()
+        for i, name in enumerate(["a", "b"]):
+            dst = prod.push("test", self.make_item(name))
+            os.utime(dst, (now - 10 + i, now - 10 + i))
+
+        prod.push("test", self.make_item("c", 5))
+        self.assertEqual(sorted(prod.list_queue("test")), ["b", "c"])
+        self.assertEqual(prod.queue_depth("test"), (2, 15))
+
+    def test_vanished(self):
+        prod, _ = self.get_engines(max_queue_length=2, overflow="drop_oldest")
+
+        now = time.time()
+        for i, name in enumerate(["a", "b"]):
+            dst = prod.push("test", self.make_item(name))
+            os.utime(dst, (now - 10 + i, now - 10 + i))
+
+        # "a" is consumed by another process while the queue is inspected
+        def consume(path):
+            if os.path.basename(path) == "a":
+                os.remove(path)
+
+            return path_size(path)
+
+        with patch("mkite_engines.local.path_size", side_effect=consume):
+            prod.push("test", self.make_item("c", 5))
+
+        self.assertEqual(sorted(prod.list_queue("test")), ["b", "c"])
+
+        prod.push("test", self.make_item("a"))
+        with patch("mkite_engines.local.path_size", side_effect=consume):
+            with patch("mkite_engines.local.DEPTH_CACHE_TTL", 0):
+                self.assertEqual(prod.queue_depth("test"), (1, 5))
+
+    def test_push_error(self):
+        prod, _ = self.get_engines(max_queue_length=2)
+        prod.push("test", self.make_item("a"))
+
+        with patch.object(prod, "_push_path", side_effect=OSError):
+            with self.assertRaises(OSError):
+                prod.push("test", self.make_item("b"))
+
+        # the reserved room is released
+        self.assertEqual(prod.queue_depth("test"), (1, 10))
+        prod.push("test", self.make_item("b"))
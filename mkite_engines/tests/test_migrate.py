@@ -0,0 +1,109 @@
+import os
+import json
+import unittest as ut
+from unittest.mock import patch
+from tempfile import TemporaryDirectory
+
+from mkite_core.models import Status
+from mkite_engines.migrate import migrate
+from mkite_engines.local import LocalProducer, LocalConsumer
+from mkite_engines.redis import RedisEngineSettings, RedisProducer, RedisConsumer
+from mkite_engines.sqlite import SqliteProducer, SqliteConsumer
+from mkite_engines.tests.utils import get_info, get_fake_redis
+
+
+class TestMigrate(ut.TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+
+        settings = RedisEngineSettings()
+        self.prod = RedisProducer.from_settings(settings)
+        self.prod._r = get_fake_redis(**self.prod.redis_kwargs)
+        self.cons = RedisConsumer.from_settings(settings)
+        self.cons._r = self.prod._r
+
+        path = os.path.join(self.tmp.name, "queue.db")
+        self.dst = SqliteProducer(path)
+        self.dst_cons = SqliteConsumer(path)
+
+        self.infos = {}
+        for queue in ["a", "b", "c"]:
+            self.infos[queue] = [get_info() for _ in range(5)]
+            for info in self.infos[queue]:
+                self.prod.push_info(queue, info)
+
+    def tearDown(self):
+        self.prod.r.flushall()
+        self.tmp.cleanup()
+
+    def test_migrate(self):
+        report = migrate(self.cons, self.dst, batch_size=2, workers=2)
+
+        self.assertEqual(report["total"], 15)
+        self.assertEqual(report["queues"], {"a": 5, "b": 5, "c": 5})
+        self.assertEqual(self.cons.list_queue_names(), [])
+        self.assertEqual(self.cons.count_by_status(), {Status.READY.value: 0})
+
+        for queue, infos in self.infos.items():
+            returned = [info for _, info in self.dst_cons.get_info_n(queue)]
+            self.assertEqual(sorted(i.uuid for i in returned), sorted(i.uuid for i in infos))
+
+    def test_checkpoint(self):
+        path = os.path.join(self.tmp.name, "checkpoint.json")
+        with open(path, "w") as f:
+            json.dump({"transferred": {"a": 5}, "completed": ["a"]}, f)
+
+        report = migrate(self.cons, self.dst, checkpoint=path)
+        self.assertEqual(report["queues"], {"b": 5, "c": 5})
+        self.assertEqual(self.cons.list_queue_names(), ["a"])
+
+        with open(path, "r") as f:
+            data = json.load(f)
+
+        self.assertEqual(sorted(data["completed"]), ["a", "b", "c"])
+        self.assertEqual(data["transferred"], {"a": 5, "b": 5, "c": 5})
+
+    def test_delete_batches(self):
+        with patch.object(self.cons, "delete") as delete:
+            with patch.object(
+                self.cons, "delete_many", wraps=self.cons.delete_many
+            ) as delete_many:
+                migrate(self.cons, self.dst, queues=["a"], batch_size=2)
+
+        delete.assert_not_called()
+        self.assertEqual(delete_many.call_count, 3)
+        self.assertEqual(self.cons.count_by_status(), {Status.READY.value: 10})
+
+    def test_write_error(self):
+        queue = self.cons.format_queue_name("a")
+        before = self.cons.list_queue(queue)
+
+        with patch.object(self.dst, "push_info_many", side_effect=OSError):
+            with self.assertRaises(OSError):
+                migrate(self.cons, self.dst, queues=["a"], batch_size=2)
+
+        self.assertEqual(self.cons.list_queue(queue), before)
+        self.assertEqual(self.cons.count_by_status(), {Status.READY.value: 15})
+
+    def test_pending(self):
+        root = os.path.join(self.tmp.name, "local")
+        path = os.path.join(self.tmp.name, "checkpoint.json")
+
+        local = LocalProducer(root)
+        for info in self.infos["a"]:
+            local.push_info("a", info)
+
+        # items are only consumed after `delay` seconds
+        src = LocalConsumer(root, delay=60)
+        report = migrate(src, self.dst, checkpoint=path)
+        self.assertEqual(report["total"], 0)
+        self.assertEqual(report["pending"], {"a": 5})
+        self.assertFalse(os.path.exists(path))
+
+        src = LocalConsumer(root, delay=0)
+        report = migrate(src, self.dst, checkpoint=path)
+        self.assertEqual(report["queues"], {"a": 5})
+        self.assertEqual(report["pending"], {})
+
+        with open(path, "r") as f:
+            self.assertEqual(json.load(f)["completed"], ["a"])
@@ -1,10 +1,15 @@
 import os
+import gzip
+import json
 import uuid
-import fakeredis
+import redis
 import unittest as ut
-from unittest.mock import patch
+from unittest.mock import Mock, patch
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import TemporaryDirectory
 
 from mkite_core.models import JobInfo, JobResults, Status
+from mkite_engines.base import EngineError, QueueFullError
 from mkite_engines.redis import (
     RedisEngineSettings,
     RedisInfoSchema,
@@ -12,19 +17,7 @@ from mkite_engines.redis import (
     RedisProducer,
     RedisConsumer,
 )
-
-
-def get_info():
-    return JobInfo(
-        job={"uuid": str(uuid.uuid4())},
-        recipe={"name": "test"},
-        options={"param1": 1},
-        inputs=[],
-    )
-
-
-def get_fake_redis(**kwargs):
-    return fakeredis.FakeStrictRedis(**kwargs)
+from mkite_engines.tests.utils import get_info, get_fake_redis, push_infos
 
 
 class TestRedisEngine(ut.TestCase):
@@ -79,6 +72,22 @@ class TestRedisEngine(ut.TestCase):
         returned = self.engine.list_queue_names()
         self.assertEqual(returned, expected)
 
+    def test_reconnect(self):
+        broken = Mock()
+        broken.ping.side_effect = redis.ConnectionError
+        client = self.engine._r
+        self.engine._r = broken
+
+        with patch.object(self.engine, "_get_new_redis", return_value=client) as new:
+            with ThreadPoolExecutor(8) as executor:
+                clients = list(executor.map(lambda _: self.engine.r, range(16)))
+
+        new.assert_called_once()
+        self.assertTrue(all(c is client for c in clients))
+
+        self.engine.close()
+        self.assertIsNone(self.engine._r)
+        self.engine._r = client
 
 class TestRedisProducer(ut.TestCase):
     def setUp(self):
@@ -159,3 +168,553 @@ class TestRedisConsumer(ut.TestCase):
         new_key, new_info = self.cons.get_info(queue)
         self.assertEqual(key, new_key)
         self.assertEqual(info, new_info)
+
+    def test_get_n(self):
+        queue = "test"
+
+        infos = [get_info() for _ in range(5)]
+        for info in infos:
+            self.prod.push_info(queue, info)
+
+        returned = list(self.cons.get_n(queue, n=3, batch_size=2))
+        expected = [(i.uuid, i.encode()) for i in reversed(infos[2:])]
+        self.assertEqual(returned, expected)
+
+        returned = list(self.cons.get_n(queue, n=10))
+        self.assertEqual(len(returned), 2)
+
+    def test_get_info_n(self):
+        queue = "test"
+
+        infos = [get_info() for _ in range(5)]
+        for info in infos:
+            self.prod.push_info(queue, info)
+
+        expected = [(i.uuid, i) for i in reversed(infos)]
+
+        returned = list(self.cons.get_info_n(queue, n=2))
+        self.assertEqual(returned, expected[:2])
+
+        returned = list(self.cons.get_info_n(queue, decode_workers=2, prefetch=1))
+        self.assertEqual(returned, expected[2:])
+
+    def test_get_n_close(self):
+        queue = "test"
+        keys = push_infos(self.prod, queue, 10)
+        depth = self.cons.queue_depth(queue)
+
+        gen = self.cons.get_n(queue, 10)
+        key, msg = next(gen)
+        gen.close()
+
+        self.assertEqual(key, keys[-1])
+        self.assertEqual(self.cons.list_queue(queue), list(reversed(keys[:-1])))
+        self.assertEqual(self.cons.queue_depth(queue), (9, depth.nbytes - len(msg)))
+
+    def test_get_info_n_expired(self):
+        queue = "test"
+        keys = push_infos(self.prod, queue, 3)
+        self.prod.r.delete(keys[1])
+
+        returned = [key for key, _ in self.cons.get_info_n(queue)]
+        self.assertEqual(returned, [keys[2], keys[0]])
+
+    def test_get_info_n_close(self):
+        queue = "test"
+        keys = push_infos(self.prod, queue, 200)
+        depth = self.cons.queue_depth(queue)
+
+        gen = self.cons.get_info_n(queue, n=200, decode_workers=2)
+        key, info = next(gen)
+        gen.close()
+
+        self.assertEqual(key, keys[-1])
+        self.assertEqual(self.cons.list_queue(queue), list(reversed(keys[:-1])))
+        size = depth.nbytes - len(info.encode())
+        self.assertEqual(self.cons.queue_depth(queue), (199, size))
+
+    def test_get_info_n_raw(self):
+        self.prod.push("raw", "item")
+
+        self.assertEqual(list(self.cons.get_info_n("raw")), [])
+        self.assertEqual(self.cons.list_queue("raw"), ["item"])
+        self.assertEqual(self.cons.queue_depth("raw"), (1, 4))
+
+    def test_decode_pool(self):
+        queue = "test"
+        push_infos(self.prod, queue, 4)
+
+        list(self.cons.get_info_n(queue, n=2, decode_workers=2))
+        pool = self.cons.get_decode_pool(2)
+        list(self.cons.get_info_n(queue, n=2, decode_workers=2))
+        self.assertIs(self.cons.get_decode_pool(2), pool)
+        self.assertIsNone(self.cons.get_decode_pool(0))
+
+        self.cons.close()
+        self.assertIsNot(self.cons.get_decode_pool(2), pool)
+        self.cons.close()
+        self.cons._r = self.prod._r
+
+
+class TestRedisTTL(ut.TestCase):
+    def setUp(self):
+        self.settings = RedisEngineSettings(
+            status_ttl={Status.DONE.value: 100, Status.ERROR.value: 0},
+            consumed_ttl=50,
+        )
+        self.prod = RedisProducer.from_settings(self.settings)
+        self.prod._r = get_fake_redis(**self.prod.redis_kwargs)
+        self.cons = RedisConsumer.from_settings(self.settings)
+        self.cons._r = self.prod._r
+
+    def tearDown(self):
+        self.prod.r.flushall()
+
+    def test_push_info(self):
+        info = get_info()
+        self.prod.push_info("test", info)
+        self.assertEqual(self.prod.r.ttl(info.uuid), -1)
+
+    def test_get(self):
+        info = get_info()
+        self.prod.push_info("test", info)
+        key, _ = self.cons.get("test")
+
+        ttl = self.cons.r.ttl(key)
+        self.assertTrue(0 < ttl <= 50)
+
+    def test_set_status(self):
+        info = get_info()
+        key = info.uuid
+        self.prod.push_info("test", info)
+
+        self.prod.set_status(key, Status.DONE.value)
+        ttl = self.prod.r.ttl(key)
+        self.assertTrue(0 < ttl <= 100)
+
+        self.prod.set_status(key, Status.READY.value)
+        self.assertEqual(self.prod.r.ttl(key), -1)
+
+    def test_get_set_status(self):
+        info = get_info()
+        self.prod.push_info("test", info)
+        key, _ = self.cons.get("test")
+
+        self.cons.set_status(key, Status.DOING.value)
+        ttl = self.cons.r.ttl(key)
+        self.assertTrue(0 < ttl <= 50)
+
+        # jobs pushed again are not expired while queued
+        self.prod.push_info("test", info)
+        self.assertEqual(self.prod.r.ttl(key), -1)
+
+    def test_gc_updated(self):
+        keys = push_infos(self.prod, "test", 1, status=Status.DONE.value)
+        self.prod.r.persist(keys[0])
+
+        index = self.prod.status_index(Status.DONE.value)
+        self.prod.r.zadd(index, {keys[0]: 1.0})
+
+        # the job is requeued after being inspected by the gc
+        expired = [(keys[0].encode(), Status.DONE.value, 100, 0)]
+        self.prod.set_status(keys[0], Status.READY.value)
+
+        report = {"deleted": 0, "reclaimed_bytes": 0}
+        self.prod._gc_delete(expired, report)
+        self.assertEqual(report["deleted"], 0)
+        self.assertTrue(self.prod.r.exists(keys[0]))
+
+    def test_requeue(self):
+        keys = push_infos(self.prod, "test", 3)
+        depth = self.cons.queue_depth("test")
+
+        returned = [key for key, _ in self.cons.get_n("test", 2)]
+        self.assertEqual(returned, keys[:0:-1])
+
+        self.cons.requeue("test", returned)
+        self.assertEqual(self.cons.list_queue("test"), keys[::-1])
+        self.assertEqual(self.cons.queue_depth("test"), depth)
+        self.assertEqual(self.cons.r.ttl(keys[2]), -1)
+
+    def test_gc(self):
+        keys = {status: str(uuid.uuid4()) for status in Status}
+        for status, key in keys.items():
+            data = RedisInfoSchema(msg="{}", status=status.value)
+            self.prod.r.hset(key, mapping=data)
+
+        self.prod.r.rpush(f"{self.prod.qprefix}test", "item")
+
+        report = self.prod.gc(dry_run=True)
+        self.assertEqual(report["scanned"], len(keys))
+        self.assertEqual(report["deleted"], 1)
+        self.assertEqual(report["expiring"], 1)
+        self.assertEqual(self.prod.r.ttl(keys[Status.DONE]), -1)
+
+        report = self.prod.gc(batch_size=2)
+        self.assertEqual(report["deleted"], 1)
+        self.assertFalse(self.prod.r.exists(keys[Status.ERROR]))
+        self.assertTrue(0 < self.prod.r.ttl(keys[Status.DONE]) <= 100)
+        self.assertEqual(self.prod.r.ttl(keys[Status.READY]), -1)
+
+        report = self.prod.gc()
+        self.assertEqual(report["deleted"], 0)
+        self.assertEqual(report["expiring"], 0)
+
+    def test_gc_recount(self):
+        keys = push_infos(self.prod, "test", 3)
+        depth = self.prod.queue_depth("test")
+
+        # the hash of a queued job expires
+        msg = self.prod.r.hget(keys[1], "msg")
+        self.prod.r.delete(keys[1])
+
+        report = self.prod.gc(dry_run=True)
+        self.assertEqual(report["recounted"], 1)
+        self.assertEqual(self.prod.queue_depth("test"), depth)
+
+        report = self.prod.gc()
+        self.assertEqual(report["recounted"], 1)
+        size = depth.nbytes - len(msg) + len(keys[1])
+        self.assertEqual(self.prod.queue_depth("test"), (3, size))
+
+        list(self.cons.get_n("test"))
+        self.assertEqual(self.cons.queue_depth("test"), (0, 0))
+        self.assertEqual(self.prod.gc()["recounted"], 0)
+
+    def test_gc_age(self):
+        infos = [get_info() for _ in range(2)]
+        for info in infos:
+            self.prod.push_info("test", info, status=Status.DONE.value)
+            self.prod.r.persist(info.uuid)
+
+        # status of the first job was updated 150 s ago
+        index = self.prod.status_index(Status.DONE.value)
+        score = self.prod.r.zscore(index, infos[0].uuid)
+        self.prod.r.zadd(index, {infos[0].uuid: score - 150})
+
+        report = self.prod.gc()
+        self.assertEqual(report["deleted"], 1)
+        self.assertEqual(report["expiring"], 1)
+        self.assertFalse(self.prod.r.exists(infos[0].uuid))
+        self.assertTrue(0 < self.prod.r.ttl(infos[1].uuid) <= 100)
+        self.assertEqual(self.prod.count_by_status(), {Status.DONE.value: 1})
+
+
+class TestRedisStatusMany(ut.TestCase):
+    def setUp(self):
+        self.settings = RedisEngineSettings()
+        self.prod = RedisProducer.from_settings(self.settings)
+        self.prod._r = get_fake_redis(**self.prod.redis_kwargs)
+
+    def tearDown(self):
+        self.prod.r.flushall()
+
+    def test_set_status_many(self):
+        keys = push_infos(self.prod, "test", 5)
+
+        outcomes = self.prod.set_status_many(keys, Status.DONE.value, batch_size=2)
+        self.assertEqual(outcomes, {k: True for k in keys})
+
+        for key in keys:
+            status = self.prod.r.hget(key, "status").decode()
+            self.assertEqual(status, Status.DONE.value)
+
+    def test_set_status_many_missing(self):
+        keys = push_infos(self.prod, "test", 2)
+
+        outcomes = self.prod.set_status_many(keys + ["missing"], Status.DONE.value)
+        self.assertEqual(outcomes, {keys[0]: True, keys[1]: True, "missing": False})
+        self.assertFalse(self.prod.r.exists("missing"))
+        self.assertEqual(self.prod.count_by_status()[Status.DONE.value], 2)
+
+    def test_set_status_many_expected(self):
+        keys = push_infos(self.prod, "test", 4)
+        self.prod.set_status(keys[0], Status.ERROR.value)
+
+        outcomes = self.prod.set_status_many(
+            keys + ["missing"],
+            Status.DOING.value,
+            expected=Status.READY.value,
+        )
+        self.assertFalse(outcomes[keys[0]])
+        self.assertFalse(outcomes["missing"])
+        self.assertTrue(all(outcomes[k] for k in keys[1:]))
+
+        status = self.prod.r.hget(keys[0], "status").decode()
+        self.assertEqual(status, Status.ERROR.value)
+        self.assertFalse(self.prod.r.exists("missing"))
+
+
+class TestRedisStatusIndex(ut.TestCase):
+    def setUp(self):
+        self.settings = RedisEngineSettings()
+        self.prod = RedisProducer.from_settings(self.settings)
+        self.prod._r = get_fake_redis(**self.prod.redis_kwargs)
+
+    def tearDown(self):
+        self.prod.r.flushall()
+
+    def list_all(self, status: str, count: int = 2):
+        cursor, keys = self.prod.list_by_status(status, count=count)
+        while cursor != 0:
+            cursor, page = self.prod.list_by_status(status, cursor, count)
+            keys += page
+
+        return keys
+
+    def test_push_info(self):
+        keys = push_infos(self.prod, "test", 5)
+
+        returned = self.list_all(Status.READY.value)
+        self.assertEqual(sorted(returned), sorted(keys))
+        self.assertEqual(self.prod.count_by_status(), {Status.READY.value: 5})
+
+    def test_set_status(self):
+        keys = push_infos(self.prod, "test", 5)
+        self.prod.set_status(keys[0], Status.DOING.value)
+        self.prod.set_status_many(keys[1:3], Status.DONE.value)
+
+        expected = {
+            Status.READY.value: 2,
+            Status.DOING.value: 1,
+            Status.DONE.value: 2,
+        }
+        self.assertEqual(self.prod.count_by_status(), expected)
+        self.assertEqual(sorted(self.list_all(Status.DONE.value)), sorted(keys[1:3]))
+        self.assertEqual(sorted(self.list_all(Status.READY.value)), sorted(keys[3:]))
+
+    def test_delete(self):
+        keys = push_infos(self.prod, "test", 2)
+        self.prod.delete(keys[0])
+
+        self.assertEqual(sorted(self.list_all(Status.READY.value)), sorted(keys[1:]))
+        self.assertEqual(self.prod.count_by_status(), {Status.READY.value: 1})
+
+    def test_delete_many(self):
+        keys = push_infos(self.prod, "test", 5)
+
+        watch = self.prod._watch_statuses
+        with patch.object(self.prod, "_watch_statuses", wraps=watch) as watched:
+            self.prod.delete_many(keys[:4], batch_size=3)
+
+        self.assertEqual(watched.call_count, 2)
+        self.assertEqual(self.list_all(Status.READY.value), keys[4:])
+        self.assertEqual(self.prod.r.exists(*keys), 1)
+
+    def test_gc_prune(self):
+        keys = push_infos(self.prod, "test", 3)
+        self.prod.r.delete(keys[0])
+
+        self.assertEqual(sorted(self.list_all(Status.READY.value)), sorted(keys[1:]))
+
+        report = self.prod.gc()
+        self.assertEqual(report["pruned"], 1)
+        self.assertEqual(self.prod.count_by_status(), {Status.READY.value: 2})
+
+    def test_count_prune(self):
+        keys = push_infos(self.prod, "test", 3)
+        self.prod.r.delete(keys[0])
+
+        self.assertEqual(self.prod.count_by_status(), {Status.READY.value: 3})
+        self.assertEqual(
+            self.prod.count_by_status(prune=True), {Status.READY.value: 2}
+        )
+
+    def test_list_ties(self):
+        keys = push_infos(self.prod, "test", 5)
+
+        index = self.prod.status_index(Status.READY.value)
+        self.prod.r.zadd(index, {k: 1.0 for k in keys})
+
+        returned = self.list_all(Status.READY.value)
+        self.assertEqual(returned, sorted(keys))
+
+    def test_list_while_updating(self):
+        keys = push_infos(self.prod, "test", 6)
+
+        # pages are moved to another status between calls, as a reaper would
+        seen = []
+        cursor, page = self.prod.list_by_status(Status.READY.value, count=2)
+        while True:
+            seen += page
+            self.prod.set_status_many(page, Status.DOING.value)
+            if cursor == 0:
+                break
+
+            cursor, page = self.prod.list_by_status(Status.READY.value, cursor, 2)
+
+        self.assertEqual(sorted(seen), sorted(keys))
+
+
+class TestRedisLimits(ut.TestCase):
+    def tearDown(self):
+        self.r.flushall()
+
+    def get_engines(self, **kwargs):
+        settings = RedisEngineSettings(**kwargs)
+        prod = RedisProducer.from_settings(settings)
+        prod._r = get_fake_redis(**prod.redis_kwargs)
+        cons = RedisConsumer.from_settings(settings)
+        cons._r = prod._r
+        self.r = prod._r
+        return prod, cons
+
+    def test_queue_depth(self):
+        prod, cons = self.get_engines()
+        infos = [get_info() for _ in range(3)]
+        for info in infos:
+            prod.push_info("test", info)
+
+        size = sum(len(i.encode()) for i in infos)
+        self.assertEqual(prod.queue_depth("test"), (3, size))
+
+        key, msg = cons.get("test")
+        self.assertEqual(prod.queue_depth("test"), (2, size - len(msg)))
+
+        list(cons.get_n("test"))
+        self.assertEqual(prod.queue_depth("test"), (0, 0))
+
+    def test_reject(self):
+        prod, _ = self.get_engines(max_queue_length=2)
+        prod.push("test", "a")
+        prod.push("test", "b")
+
+        with self.assertRaises(QueueFullError):
+            prod.push("test", "c")
+
+        with self.assertRaises(QueueFullError):
+            prod.push_info("test", get_info())
+
+        self.assertEqual(prod.list_queue("test"), ["b", "a"])
+
+    def test_block(self):
+        prod, cons = self.get_engines(
+            max_queue_bytes=1, overflow="block", block_timeout=0.2
+        )
+        prod.push("test", "a")
+
+        with self.assertRaises(QueueFullError):
+            prod.push("test", "b")
+
+        cons.get("test")
+        prod.push("test", "b")
+        self.assertEqual(prod.list_queue("test"), ["b"])
+
+    def test_drop_oldest(self):
+        prod, _ = self.get_engines(max_queue_length=2, overflow="drop_oldest")
+        infos = [get_info() for _ in range(3)]
+        for info in infos:
+            prod.push_info("test", info)
+
+        expected = [infos[2].uuid, infos[1].uuid]
+        self.assertEqual(prod.list_queue("test"), expected)
+        self.assertFalse(prod.r.exists(infos[0].uuid))
+        self.assertEqual(prod.count_by_status(), {Status.READY.value: 2})
+
+        size = sum(len(i.encode()) for i in infos[1:])
+        self.assertEqual(prod.queue_depth("test"), (2, size))
+
+
+class TestRedisArchive(ut.TestCase):
+    def setUp(self):
+        self.settings = RedisEngineSettings(status_ttl={Status.DONE.value: 1000})
+        self.prod = RedisProducer.from_settings(self.settings)
+        self.prod._r = get_fake_redis(**self.prod.redis_kwargs)
+
+    def tearDown(self):
+        self.prod.r.flushall()
+
+    def test_export_import(self):
+        infos = [get_info() for _ in range(5)]
+        for info in infos[:3]:
+            self.prod.push_info("a", info)
+
+        for info in infos[3:]:
+            self.prod.push_info("b", info, status=Status.DONE.value)
+
+        self.prod.push("b", "raw")
+
+        queues = {q: self.prod.list_queue(q) for q in ["a", "b"]}
+        depths = {q: self.prod.queue_depth(q) for q in ["a", "b"]}
+        counts = self.prod.count_by_status()
+
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "archive.jsonl.gz")
+            report = self.prod.export(path, batch_size=2)
+            self.assertEqual(report, {"queues": 2, "items": 6, "jobs": 5})
+
+            self.prod.r.flushall()
+            report = self.prod.import_(path)
+            self.assertEqual(report, {"queues": 2, "items": 6, "jobs": 5})
+
+        for q in ["a", "b"]:
+            self.assertEqual(self.prod.list_queue(q), queues[q])
+            self.assertEqual(self.prod.queue_depth(q), depths[q])
+
+        self.assertEqual(self.prod.count_by_status(), counts)
+
+        for info in infos:
+            msg = self.prod.r.hget(info.uuid, "msg")
+            self.assertEqual(msg, info.encode())
+
+        self.assertEqual(self.prod.r.ttl(infos[0].uuid), -1)
+        self.assertTrue(0 < self.prod.r.ttl(infos[4].uuid) <= 1000)
+
+    def test_export_in_flight(self):
+        cons = RedisConsumer.from_settings(self.settings)
+        cons._r = self.prod._r
+
+        keys = push_infos(self.prod, "a", 3)
+        key, _ = cons.get("a")
+        cons.set_status(key, Status.DOING.value)
+        key, _ = cons.get("a")
+        cons.set_status(key, Status.DONE.value)
+
+        counts = self.prod.count_by_status()
+
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "archive.jsonl.gz")
+            report = self.prod.export(path, batch_size=2)
+            self.assertEqual(report, {"queues": 1, "items": 1, "jobs": 3})
+
+            self.prod.r.flushall()
+            self.prod.import_(path)
+
+        self.assertEqual(self.prod.list_queue("a"), keys[:1])
+        self.assertEqual(self.prod.count_by_status(), counts)
+
+        for key in keys:
+            self.assertTrue(self.prod.r.exists(key))
+
+    def test_export_duplicates(self):
+        keys = push_infos(self.prod, "a", 2)
+        self.prod.r.zrem(self.prod.status_index(Status.READY.value), keys[0])
+        depth = self.prod.queue_depth("a")
+
+        # SCAN returns the queue twice
+        scan_iter = self.prod.r.scan_iter
+        scanned = lambda *args, **kwargs: 2 * list(scan_iter(*args, **kwargs))
+
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "archive.jsonl.gz")
+            with patch.object(self.prod.r, "scan_iter", side_effect=scanned):
+                report = self.prod.export(path)
+
+            # the job without index entry is exported with its queue
+            self.assertEqual(report, {"queues": 1, "items": 2, "jobs": 2})
+
+            self.prod.r.flushall()
+            self.prod.import_(path)
+
+        self.assertEqual(self.prod.list_queue("a"), keys[::-1])
+        self.assertEqual(self.prod.queue_depth("a"), depth)
+        self.assertEqual(self.prod.r.exists(*keys), 2)
+
+    def test_import_version(self):
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "archive.jsonl.gz")
+            with gzip.open(path, "wt") as f:
+                f.write(json.dumps({"format": "mkite-redis", "version": 99}) + "\n")
+
+            with self.assertRaises(EngineError):
+                self.prod.import_(path)
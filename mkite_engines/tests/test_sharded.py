@@ -0,0 +1,142 @@
+import fakeredis
+import unittest as ut
+from unittest.mock import patch
+
+from mkite_core.models import Status
+from mkite_engines.redis import RedisEngine
+from mkite_engines.sharded import (
+    HashRing,
+    ShardedEngineSettings,
+    ShardedProducer,
+    ShardedConsumer,
+    hash_tag,
+)
+from mkite_engines.tests.utils import push_infos
+
+
+ENDPOINTS = ["localhost:7001", "localhost:7002", "localhost:7003"]
+
+
+class TestHashRing(ut.TestCase):
+    def test_hash_tag(self):
+        self.assertEqual(hash_tag("queue:test"), "queue:test")
+        self.assertEqual(hash_tag("{queue:test}abc"), "queue:test")
+        self.assertEqual(hash_tag("{}abc"), "{}abc")
+        self.assertEqual(hash_tag("abc{def"), "abc{def")
+
+    def test_get(self):
+        ring = HashRing(ENDPOINTS[:2])
+        keys = [f"queue:{i}" for i in range(200)]
+        before = {k: ring.get(k) for k in keys}
+
+        self.assertEqual(set(before.values()), set(ENDPOINTS[:2]))
+        self.assertEqual(ring.get("{queue:1}abc"), before["queue:1"])
+
+        ring.add(ENDPOINTS[2])
+        after = {k: ring.get(k) for k in keys}
+
+        # keys either stay or move to the new node
+        for k in keys:
+            self.assertIn(after[k], [before[k], ENDPOINTS[2]])
+
+        self.assertIn(ENDPOINTS[2], after.values())
+
+        ring.remove(ENDPOINTS[2])
+        self.assertEqual(before, {k: ring.get(k) for k in keys})
+
+
+class TestShardedEngine(ut.TestCase):
+    def setUp(self):
+        self.servers = {ep: fakeredis.FakeServer() for ep in ENDPOINTS}
+
+        def get_new_redis(engine):
+            kw = engine.redis_kwargs
+            server = self.servers[f"{kw['host']}:{kw['port']}"]
+            return fakeredis.FakeStrictRedis(server=server)
+
+        self.patcher = patch.object(RedisEngine, "_get_new_redis", get_new_redis)
+        self.patcher.start()
+
+        self.settings = ShardedEngineSettings(endpoints=ENDPOINTS[:2])
+        self.prod = ShardedProducer.from_settings(self.settings)
+        self.cons = ShardedConsumer.from_settings(self.settings)
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def push_queues(self, queues, n: int = 3):
+        keys = {}
+        for queue in queues:
+            for key in push_infos(self.prod, queue, n):
+                keys[key] = queue
+
+        return keys
+
+    def assert_placement(self, engine):
+        for endpoint, shard in engine.shards.items():
+            for key in shard.r.scan_iter():
+                key = key.decode()
+                if key.startswith(shard.status_prefix) or key == "statuses":
+                    continue
+
+                self.assertEqual(engine.ring.get(key), endpoint)
+
+    def test_push_get(self):
+        queues = [f"q{i}" for i in range(10)]
+        keys = self.push_queues(queues)
+
+        self.assertEqual(sorted(self.prod.list_queue_names()), sorted(queues))
+        self.assert_placement(self.prod)
+
+        for queue in queues:
+            shard = self.prod.shard_for_queue(queue)
+            self.assertEqual(len(shard.list_queue(queue)), 3)
+
+            endpoint = self.prod.ring.get(self.prod.format_queue_name(queue))
+            for key, info in self.cons.get_info_n(queue):
+                self.assertEqual(keys[info.uuid], queue)
+                self.assertTrue(key.endswith(info.uuid))
+                self.assertEqual(self.cons.ring.get(key), endpoint)
+
+    def test_status(self):
+        queues = [f"q{i}" for i in range(10)]
+        self.push_queues(queues, n=2)
+
+        counts = self.prod.count_by_status()
+        self.assertEqual(counts, {Status.READY.value: 20})
+
+        cursor, keys = self.prod.list_by_status(Status.READY.value, count=3)
+        while cursor != 0:
+            cursor, page = self.prod.list_by_status(Status.READY.value, cursor, 3)
+            keys += page
+
+        self.assertEqual(len(set(keys)), 20)
+
+        outcomes = self.prod.set_status_many(keys[:5], Status.DONE.value)
+        self.assertTrue(all(outcomes.values()))
+
+        counts = self.prod.count_by_status()
+        self.assertEqual(counts[Status.DONE.value], 5)
+        self.assertEqual(counts[Status.READY.value], 15)
+
+        self.prod.delete_many(keys[:5])
+        counts = self.prod.count_by_status()
+        self.assertEqual(counts[Status.DONE.value], 0)
+        self.assertEqual(counts[Status.READY.value], 15)
+
+    def test_rebalance(self):
+        queues = [f"q{i}" for i in range(20)]
+        self.push_queues(queues)
+
+        moved = self.prod.add_shard(ENDPOINTS[2])
+        self.assertGreater(moved, 0)
+        self.assert_placement(self.prod)
+        self.assertEqual(self.prod.count_by_status(), {Status.READY.value: 60})
+
+        moved = self.prod.remove_shard(ENDPOINTS[0])
+        self.assertGreater(moved, 0)
+        self.assert_placement(self.prod)
+        self.assertEqual(self.prod.count_by_status(), {Status.READY.value: 60})
+
+        for queue in queues:
+            self.assertEqual(len(self.prod.list_queue(queue)), 3)
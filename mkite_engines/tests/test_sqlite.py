@@ -0,0 +1,138 @@
+import os
+import unittest as ut
+from tempfile import TemporaryDirectory
+
+from mkite_core.models import Status
+from mkite_engines.base import EngineRoles
+from mkite_engines.instantiate import get_engine_class
+from mkite_engines.sqlite import (
+    SqliteEngineSettings,
+    SqliteProducer,
+    SqliteConsumer,
+)
+from mkite_engines.tests.utils import get_info
+
+
+class TestSqliteEngine(ut.TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        path = os.path.join(self.tmp.name, "queue.db")
+        self.settings = SqliteEngineSettings(path=path)
+        self.prod = SqliteProducer.from_settings(self.settings)
+        self.cons = SqliteConsumer.from_settings(self.settings)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_get_engine_class(self):
+        cls = get_engine_class("mkite_engines.sqlite", EngineRoles.producer)
+        self.assertEqual(cls, SqliteProducer)
+
+    def test_wal(self):
+        mode = self.prod.conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, "wal")
+
+    def test_queues(self):
+        self.assertEqual(self.prod.list_queue_names(), [])
+
+        self.prod.add_queue("empty")
+        self.prod.push("test", "item", key="key")
+        self.assertEqual(self.prod.list_queue_names(), ["empty", "test"])
+        self.assertEqual(self.prod.list_queue("test"), ["key"])
+
+        self.prod.delete(self.prod.format_queue_name("empty"))
+        self.assertEqual(self.prod.list_queue_names(), ["test"])
+
+    def test_push_get(self):
+        keys = [self.prod.push("test", f"item{i}") for i in range(5)]
+
+        key, item = self.cons.get("test")
+        self.assertEqual((key, item), (keys[0], "item0"))
+
+        returned = list(self.cons.get_n("test", n=2))
+        self.assertEqual(returned, [(keys[1], "item1"), (keys[2], "item2")])
+
+        returned = self.cons.pop_n("test", n=10)
+        self.assertEqual([k for k, _ in returned], keys[3:])
+        self.assertEqual(self.cons.get("test"), (None, None))
+
+    def test_requeue(self):
+        keys = [self.prod.push("test", f"item{i}") for i in range(3)]
+
+        returned = list(self.cons.get_n("test", n=2))
+        self.cons.requeue("test", [k for k, _ in returned])
+
+        returned = list(self.cons.get_n("test"))
+        self.assertEqual([k for k, _ in returned], keys)
+
+    def test_get_n_close(self):
+        keys = [self.prod.push("test", f"item{i}") for i in range(3)]
+
+        gen = self.cons.get_n("test")
+        key, _ = next(gen)
+        gen.close()
+
+        self.assertEqual(key, keys[0])
+        self.assertEqual(self.cons.list_queue("test"), keys[1:])
+
+    def test_same_key(self):
+        self.prod.push("a", "x", key="k")
+        self.prod.push("b", "y", key="k")
+
+        self.assertEqual(self.cons.pop("a"), ("k", "x"))
+        self.assertEqual(self.cons.list_queue("b"), ["k"])
+
+        self.prod.push("a", "z", key="k")
+        key, _ = self.cons.get("b")
+        self.cons.set_status(key, Status.DONE.value)
+        self.assertEqual(self.cons.count_by_status(), {Status.DONE.value: 1})
+        self.cons.delete(key)
+
+        self.assertEqual(self.cons.list_queue("a"), ["k"])
+        self.assertEqual(self.cons.count_by_status(), {})
+
+    def test_delete_many(self):
+        keys = [self.prod.push("test", f"item{i}") for i in range(3)]
+        self.prod.push("other", "item", key=keys[0])
+
+        # claimed rows are deleted rather than the ones in other queues
+        claimed = [key for key, _ in self.cons.get_n("test", 2)]
+        self.cons.delete_many(claimed + ["missing"])
+        self.cons.requeue("test", claimed)
+
+        self.assertEqual(self.cons.list_queue("test"), keys[2:])
+        self.assertEqual(self.cons.list_queue("other"), [keys[0]])
+
+    def test_push_info(self):
+        infos = [get_info() for _ in range(3)]
+        keys = self.prod.push_info_many("test", infos)
+        self.assertEqual(keys, [i.uuid for i in infos])
+
+        key, info = self.cons.get_info("test")
+        self.assertEqual((key, info), (infos[0].uuid, infos[0]))
+
+        returned = list(self.cons.get_info_n("test"))
+        self.assertEqual(returned, [(i.uuid, i) for i in infos[1:]])
+
+        key, _ = self.cons.pop("test")
+        self.assertIsNone(key)
+
+    def test_status(self):
+        infos = [get_info() for _ in range(4)]
+        keys = self.prod.push_info_many("test", infos)
+        self.assertEqual(self.prod.count_by_status(), {Status.READY.value: 4})
+
+        self.prod.set_status(keys[0], Status.ERROR.value)
+        outcomes = self.prod.set_status_many(
+            keys, Status.DONE.value, expected=Status.READY.value
+        )
+        self.assertEqual(outcomes, {k: k != keys[0] for k in keys})
+
+        expected = {Status.ERROR.value: 1, Status.DONE.value: 3}
+        self.assertEqual(self.prod.count_by_status(), expected)
+
+        cursor, returned = self.prod.list_by_status(Status.DONE.value, count=2)
+        self.assertNotEqual(cursor, 0)
+        cursor, page = self.prod.list_by_status(Status.DONE.value, cursor, 2)
+        self.assertEqual(cursor, 0)
+        self.assertEqual(returned + page, keys[1:])
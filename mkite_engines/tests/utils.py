@@ -0,0 +1,27 @@
+import uuid
+import fakeredis
+
+from typing import List
+from mkite_core.models import JobInfo
+
+
+def get_info():
+    return JobInfo(
+        job={"uuid": str(uuid.uuid4())},
+        recipe={"name": "test"},
+        options={"param1": 1},
+        inputs=[],
+    )
+
+
+def get_fake_redis(**kwargs):
+    return fakeredis.FakeStrictRedis(**kwargs)
+
+
+def push_infos(prod, queue: str, n: int, **kwargs) -> List[str]:
+    """Pushes `n` new JobInfo to `queue` and returns their keys"""
+    infos = [get_info() for _ in range(n)]
+    for info in infos:
+        prod.push_info(queue, info, **kwargs)
+
+    return [info.uuid for info in infos]